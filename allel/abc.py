@@ -28,6 +28,21 @@ class ArrayWrapper(object):
         """
         return self._values
 
+    # the most frequently accessed attributes are delegated explicitly, to avoid
+    # going through the slower __getattr__ fallback
+
+    @property
+    def shape(self):
+        return self._values.shape
+
+    @property
+    def dtype(self):
+        return self._values.dtype
+
+    @property
+    def ndim(self):
+        return self._values.ndim
+
     @property
     def caption(self):
         return '<%s shape=%s dtype=%s>' % (type(self).__name__, self.shape, self.dtype)
@@ -10,7 +10,22 @@ import numpy as np
 from allel.compat import string_types, integer_types, range
 from allel.chunked import util as _util
 from allel.abc import ArrayWrapper, DisplayAsTable
-from allel.model.ndarray import subset as _numpy_subset, NumpyRecArrayWrapper
+from allel.model.ndarray import NumpyRecArrayWrapper
+
+
+def _read_strided(data, start, stop, step):
+    # read rows start:stop:step; strided selections are much slower than
+    # contiguous ones for some storage layers (e.g., h5py), so unless rows are
+    # so far apart that most of each block would be wasted, read whole blocks
+    # and stride in memory instead
+    if step == 1 or isinstance(data, np.ndarray):
+        return data[start:stop:step]
+    blen = _util.get_blen_array(data)
+    if step >= blen or stop - start <= step:
+        return data[start:stop:step]
+    return np.concatenate([block[(start - i) % step::step]
+                           for i, block in _util.iter_blocks(data, blen, start=start,
+                                                             stop=stop)])
 
 
 def store(data, arr, start=0, stop=None, offset=0, blen=None):
@@ -26,14 +41,52 @@ def store(data, arr, start=0, stop=None, offset=0, blen=None):
     if length < 0:
         raise ValueError('invalid stop/start')
 
-    # copy block-wise
-    for bi in range(start, stop, blen):
-        bj = min(bi+blen, stop)
-        bl = bj - bi
-        arr[offset:offset+bl] = data[bi:bj]
+    # copy block-wise, reading ahead while writing
+    blocks = _util.iter_blocks(data, blen, start=start, stop=stop)
+    for _, block in _util.read_ahead(blocks):
+        bl = len(block)
+        arr[offset:offset+bl] = block
         offset += bl
 
 
+def _store_blocks(blocks, storage, create, expectedlen, **kwargs):
+    """Create a new array from the first of `blocks` and append the rest."""
+
+    # buffer appended blocks until they fill the current chunk of the output,
+    # so that each chunk is compressed once rather than rewritten by every
+    # append which lands in it
+    out = None
+    chunklen = None
+    pending = []
+    n_pending = 0
+
+    def flush():
+        if len(pending) == 1:
+            out.append(pending[0])
+        else:
+            out.append(np.concatenate(pending, axis=0))
+
+    for block in blocks:
+        if out is None:
+            out = getattr(storage, create)(block, expectedlen=expectedlen, **kwargs)
+            if create == 'array' and len(out):
+                chunklen = _util.get_blen_array(out)
+            continue
+        if chunklen is None:
+            out.append(block)
+            continue
+        pending.append(block)
+        n_pending += len(block)
+        if len(out) % chunklen + n_pending >= chunklen:
+            flush()
+            pending = []
+            n_pending = 0
+    if pending:
+        flush()
+
+    return out
+
+
 def copy(data, start=0, stop=None, blen=None, storage=None, create='array',
          **kwargs):
     """Copy `data` block-wise into a new array."""
@@ -49,17 +102,10 @@ def copy(data, start=0, stop=None, blen=None, storage=None, create='array',
     if length < 0:
         raise ValueError('invalid stop/start')
 
-    # copy block-wise
-    out = None
-    for i in range(start, stop, blen):
-        j = min(i+blen, stop)
-        block = data[i:j]
-        if out is None:
-            out = getattr(storage, create)(block, expectedlen=length, **kwargs)
-        else:
-            out.append(block)
-
-    return out
+    # copy block-wise, reading ahead while writing
+    blocks = _util.iter_blocks(data, blen, start=start, stop=stop)
+    blocks = (block for _, block in _util.read_ahead(blocks))
+    return _store_blocks(blocks, storage, create, length, **kwargs)
 
 
 def copy_table(tbl, start=0, stop=None, blen=None, storage=None,
@@ -78,11 +124,14 @@ def copy_table(tbl, start=0, stop=None, blen=None, storage=None,
     if length < 0:
         raise ValueError('invalid stop/start')
 
-    # copy block-wise
+    # copy block-wise, reading ahead while writing
+    def iter_blocks():
+        for i in range(start, stop, blen):
+            j = min(i+blen, stop)
+            yield [c[i:j] for c in columns]
+
     out = None
-    for i in range(start, stop, blen):
-        j = min(i+blen, stop)
-        res = [c[i:j] for c in columns]
+    for res in _util.read_ahead(iter_blocks()):
         if out is None:
             out = getattr(storage, create)(res, names=names,
                                            expectedlen=length, **kwargs)
@@ -107,32 +156,63 @@ def map_blocks(data, f, blen=None, storage=None, create='array', **kwargs):
     else:
         length = len(data)
 
-    # block-wise iteration
-    out = None
-    for i in range(0, length, blen):
-        j = min(i+blen, length)
-
-        # obtain blocks
+    # obtain blocks
+    def iter_blocks():
         if isinstance(data, tuple):
-            blocks = [d[i:j] for d in data]
+            for i in range(0, length, blen):
+                j = min(i+blen, length)
+                yield [d[i:j] for d in data]
         else:
-            blocks = [data[i:j]]
+            for _, block in _util.iter_blocks(data, blen):
+                yield [block]
+
+    # block-wise iteration, mapping blocks in parallel
+    results = _util.starmap_blocks(f, iter_blocks())
+    return _store_blocks(results, storage, create, length, **kwargs)
+
+
+def _tree_reduce(results, block_reducer):
+    # combine results pairwise as a balanced binary tree, which is more accurate
+    # than a running total for floating point sums, while holding at most
+    # log2(n) partial results at any one time
+    stack = []
+    for res in results:
+        level = 0
+        while stack and stack[-1][0] == level:
+            _, prev = stack.pop()
+            res = _combine(block_reducer, prev, res)
+            level += 1
+        stack.append((level, res))
+    out = None
+    while stack:
+        _, res = stack.pop()
+        out = res if out is None else _combine(block_reducer, res, out)
+    return out
 
-        # map
-        res = f(*blocks)
 
-        # store
-        if out is None:
-            out = getattr(storage, create)(res, expectedlen=length, **kwargs)
-        else:
-            out.append(res)
+def _combine(block_reducer, a, b):
+    # reuse the memory of the left operand where possible, rather than allocate
+    # a new array for every pair of results combined
+    if isinstance(block_reducer, np.ufunc) and isinstance(a, np.ndarray) and \
+            a.ndim > 0 and a.flags.owndata and a.flags.writeable and \
+            a.shape == np.shape(b) and a.dtype == np.result_type(a, b):
+        return block_reducer(a, b, out=a)
+    return block_reducer(a, b)
 
-    return out
+
+def _until(results, limit):
+    # stop consuming results once the limit has been reached
+    for res in results:
+        yield res
+        if res == limit:
+            return
 
 
 def reduce_axis(data, reducer, block_reducer, mapper=None, axis=None,
-                blen=None, storage=None, create='array', **kwargs):
-    """Apply an operation to `data` that reduces over one or more axes."""
+                blen=None, storage=None, create='array', limit=None, **kwargs):
+    """Apply an operation to `data` that reduces over one or more axes. If
+    `limit` is given and reducing over all axes, stop as soon as any block
+    reduces to this value."""
 
     # setup
     storage = _util.get_storage(storage)
@@ -149,19 +229,22 @@ def reduce_axis(data, reducer, block_reducer, mapper=None, axis=None,
     if kwarg_out is not None:
         raise ValueError('keyword argument "out" is not supported')
 
+    # reduce blocks in parallel
+    def iter_blocks():
+        for _, block in _util.iter_blocks(data, blen):
+            yield (block,)
+
+    def f(block):
+        if mapper:
+            block = mapper(block)
+        return reducer(block, axis=axis)
+
     if axis is None or 0 in axis:
         # two-step reduction
-        out = None
-        for i in range(0, length, blen):
-            j = min(i+blen, length)
-            block = data[i:j]
-            if mapper:
-                block = mapper(block)
-            res = reducer(block, axis=axis)
-            if out is None:
-                out = res
-            else:
-                out = block_reducer(out, res)
+        results = _util.starmap_blocks(f, iter_blocks())
+        if axis is None and limit is not None:
+            results = _until(results, limit)
+        out = _tree_reduce(results, block_reducer)
         if np.isscalar(out):
             return out
         elif len(out.shape) == 0:
@@ -171,41 +254,84 @@ def reduce_axis(data, reducer, block_reducer, mapper=None, axis=None,
 
     else:
         # first dimension is preserved, no need to reduce blocks
-        out = None
-        for i in range(0, length, blen):
-            j = min(i+blen, length)
-            block = data[i:j]
-            if mapper:
-                block = mapper(block)
-            r = reducer(block, axis=axis)
-            if out is None:
-                out = getattr(storage, create)(r, expectedlen=length, **kwargs)
-            else:
-                out.append(r)
-        return out
+        results = _util.starmap_blocks(f, iter_blocks())
+        return _store_blocks(results, storage, create, length, **kwargs)
+
+
+def _plane_reducer(reducer):
+    # numpy is very slow to reduce over the middle or last axis of a
+    # 3-dimensional array when the last dimension is short (e.g., ploidy), so
+    # in that case reduce each plane of the last dimension separately, which is
+    # much faster
+    def f(block, axis=None):
+        if axis is None or len(block.shape) != 3:
+            return reducer(block, axis=axis)
+        axis = tuple(sorted(a % 3 for a in axis))
+        if axis == (1,):
+            block = np.asarray(block)
+            return np.stack([reducer(block[..., k], axis=1)
+                             for k in range(block.shape[2])], axis=-1)
+        if axis in {(2,), (0, 2)}:
+            # reduce each plane over the leading axis if required, then reduce
+            # across planes, which is also a fast reduction over the leading axis
+            block = np.asarray(block)
+            planes = [block[..., k] for k in range(block.shape[2])]
+            if axis == (0, 2):
+                planes = [reducer(p, axis=0) for p in planes]
+            return reducer(np.stack(planes), axis=0)
+        return reducer(block, axis=axis)
+    return f
+
+
+def _sum(block, axis=None):
+    # summing 1-byte integers is about twice as fast with a 32-bit accumulator
+    # as with the default 64-bit one, so use that when it cannot overflow,
+    # then cast to the dtype numpy would otherwise have returned
+    if isinstance(block, np.ndarray) and block.dtype.itemsize == 1 and \
+            block.dtype.kind in 'biu':
+        if axis is None:
+            n = block.size
+        else:
+            axes = (axis,) if isinstance(axis, int) else axis
+            n = int(np.prod([block.shape[a] for a in axes]))
+        if n * 255 < 2**31:
+            dtype = np.uint if block.dtype.kind == 'u' else np.int_
+            return np.sum(block, axis=axis, dtype='i4').astype(dtype)
+    return np.sum(block, axis=axis)
+
+
+def _dtype_limit(data, mapper, f):
+    # no block can reduce beyond the range of an integer dtype
+    if mapper is None and data.dtype.kind in 'iu':
+        return f(np.iinfo(data.dtype))
+    return None
 
 
 def amax(data, axis=None, mapper=None, blen=None, storage=None,
          create='array', **kwargs):
     """Compute the maximum value."""
-    return reduce_axis(data, axis=axis, reducer=np.amax,
+    limit = _dtype_limit(data, mapper, lambda info: info.max)
+    return reduce_axis(data, axis=axis, reducer=_plane_reducer(np.amax),
                        block_reducer=np.maximum, mapper=mapper,
-                       blen=blen, storage=storage, create=create, **kwargs)
+                       blen=blen, storage=storage, create=create, limit=limit,
+                       **kwargs)
 
 
 def amin(data, axis=None, mapper=None, blen=None, storage=None,
          create='array', **kwargs):
     """Compute the minimum value."""
-    return reduce_axis(data, axis=axis, reducer=np.amin,
+    limit = _dtype_limit(data, mapper, lambda info: info.min)
+    return reduce_axis(data, axis=axis, reducer=_plane_reducer(np.amin),
                        block_reducer=np.minimum, mapper=mapper,
-                       blen=blen, storage=storage, create=create, **kwargs)
+                       blen=blen, storage=storage, create=create, limit=limit,
+                       **kwargs)
 
 
 # noinspection PyShadowingBuiltins
 def asum(data, axis=None, mapper=None, blen=None, storage=None,
          create='array', **kwargs):
     """Compute the sum."""
-    return reduce_axis(data, axis=axis, reducer=np.sum,
+    return reduce_axis(data, axis=axis, reducer=_plane_reducer(_sum),
                        block_reducer=np.add, mapper=mapper,
                        blen=blen, storage=storage, create=create, **kwargs)
 
@@ -229,47 +355,76 @@ def compress(condition, data, axis=0, out=None, blen=None, storage=None, create=
     storage = _util.get_storage(storage)
     blen = _util.get_blen_array(data, blen)
     length = len(data)
-    nnz = count_nonzero(condition)
 
     if axis == 0:
         _util.check_equal_length(data, condition)
 
-        # block iteration
-        out = None
-        for i in range(0, length, blen):
-            j = min(i+blen, length)
-            bcond = np.asarray(condition[i:j])
-            # don't access any data unless we have to
-            if np.any(bcond):
-                block = np.asarray(data[i:j])
-                res = np.compress(bcond, block, axis=0)
-                if out is None:
-                    out = getattr(storage, create)(res, expectedlen=nnz, **kwargs)
-                else:
-                    out.append(res)
-        return out
+        # find the selected rows once up front, rather than scanning the
+        # condition for each block
+        indices = np.flatnonzero(np.asarray(condition))
+        return _take_rows(data, indices, blen, storage, create, **kwargs)
 
     elif axis == 1:
 
-        # block iteration
-        out = None
+        # only access the range of columns spanning the selection, so that
+        # storage chunks lying wholly outside it are never decompressed
         condition = np.asanyarray(condition)
-        for i in range(0, length, blen):
-            j = min(i+blen, length)
-            block = np.asarray(data[i:j])
-            res = np.compress(condition, block, axis=1)
-            if out is None:
-                out = getattr(storage, create)(res, expectedlen=length,
-                                               **kwargs)
-            else:
-                out.append(res)
+        sel = np.flatnonzero(condition)
+        if len(sel):
+            cols = slice(sel[0], sel[-1] + 1)
+        else:
+            cols = slice(None)
+        bcond = condition[cols]
 
-        return out
+        def iter_blocks():
+            for i in range(0, length, blen):
+                j = min(i+blen, length)
+                yield (np.asarray(data[i:j, cols]),)
+
+        def f(block):
+            return np.compress(bcond, block, axis=1)
+
+        # block iteration
+        results = _util.starmap_blocks(f, iter_blocks())
+        return _store_blocks(results, storage, create, length, **kwargs)
 
     else:
         raise NotImplementedError('axis not supported: %s' % axis)
 
 
+def _block_splits(indices, length, blen):
+    # find the start of each block, and the position in the sorted `indices` of
+    # the first index falling within each block
+    block_starts = np.arange(0, length + blen, blen)
+    block_starts[-1] = length
+    splits = np.searchsorted(indices, block_starts)
+    return block_starts, splits
+
+
+def _take_rows(data, indices, blen, storage, create, **kwargs):
+    # take rows at the given strictly increasing, in-bounds `indices`
+    length = len(data)
+
+    # locate the indices falling within each block, so that blocks
+    # containing no selected items are never accessed
+    block_starts, splits = _block_splits(indices, length, blen)
+
+    def iter_blocks():
+        for k in range(len(block_starts) - 1):
+            bi, bj = splits[k], splits[k+1]
+            if bj > bi:
+                i = block_starts[k]
+                j = min(i+blen, length)
+                yield np.asarray(data[i:j]), indices[bi:bj] - i
+
+    def f(block, bindices):
+        return np.take(block, bindices, axis=0)
+
+    # block iteration
+    results = _util.starmap_blocks(f, iter_blocks())
+    return _store_blocks(results, storage, create, len(indices), **kwargs)
+
+
 def take(data, indices, axis=0, out=None, mode='raise', blen=None, storage=None,
          create='array', **kwargs):
     """Take elements from an array along an axis."""
@@ -289,11 +444,13 @@ def take(data, indices, axis=0, out=None, mode='raise', blen=None, storage=None,
                 'indices must be strictly increasing'
             )
 
-        # implement via compress()
-        condition = np.zeros((length,), dtype=bool)
-        condition[indices] = True
-        return compress(condition, data, axis=0, blen=blen, storage=storage,
-                        create=create, **kwargs)
+        # setup
+        storage = _util.get_storage(storage)
+        blen = _util.get_blen_array(data, blen)
+        if len(indices) and (indices[0] < 0 or indices[-1] >= length):
+            raise IndexError('index out of bounds')
+
+        return _take_rows(data, indices, blen, storage, create, **kwargs)
 
     elif axis == 1:
 
@@ -301,18 +458,23 @@ def take(data, indices, axis=0, out=None, mode='raise', blen=None, storage=None,
         storage = _util.get_storage(storage)
         blen = _util.get_blen_array(data, blen)
 
+        # only access the range of columns spanning the selection, if indices
+        # are valid
+        indices = np.asanyarray(indices)
+        cols = slice(None)
+        if mode == 'raise' and len(indices) and \
+                0 <= np.min(indices) and np.max(indices) < data.shape[1]:
+            cols = slice(np.min(indices), np.max(indices) + 1)
+            indices = indices - cols.start
+
         # block iteration
-        out = None
-        for i in range(0, length, blen):
-            j = min(i+blen, length)
-            block = data[i:j]
-            res = np.take(block, indices, axis=1, mode=mode)
-            if out is None:
-                out = getattr(storage, create)(res, expectedlen=length,
-                                               **kwargs)
-            else:
-                out.append(res)
-        return out
+        def iter_results():
+            for i in range(0, length, blen):
+                j = min(i+blen, length)
+                block = data[i:j, cols]
+                yield np.take(block, indices, axis=1, mode=mode)
+
+        return _store_blocks(iter_results(), storage, create, length, **kwargs)
 
     else:
         raise NotImplementedError('axis not supported: %s' % axis)
@@ -332,21 +494,33 @@ def compress_table(condition, tbl, axis=None, out=None, blen=None, storage=None,
     names, columns = _util.check_table_like(tbl)
     blen = _util.get_blen_table(tbl, blen)
     _util.check_equal_length(columns[0], condition)
+    indices = np.flatnonzero(np.asarray(condition))
+
+    return _take_table_rows(names, columns, indices, blen, storage, create,
+                            **kwargs)
+
+
+def _take_table_rows(names, columns, indices, blen, storage, create, **kwargs):
+    # take rows at the given strictly increasing, in-bounds `indices`
     length = len(columns[0])
-    nnz = count_nonzero(condition)
+
+    # locate the indices falling within each block, so that blocks
+    # containing no selected rows are never accessed
+    block_starts, splits = _block_splits(indices, length, blen)
 
     # block iteration
     out = None
-    for i in range(0, length, blen):
-        j = min(i+blen, length)
-        bcond = condition[i:j]
-        # don't access any data unless we have to
-        if np.any(bcond):
-            bcolumns = [c[i:j] for c in columns]
-            res = [np.compress(bcond, c, axis=0) for c in bcolumns]
+    for k in range(len(block_starts) - 1):
+        bi, bj = splits[k], splits[k+1]
+        if bj > bi:
+            i = block_starts[k]
+            j = min(i+blen, length)
+            bindices = indices[bi:bj] - i
+            res = [np.take(c[i:j], bindices, axis=0) for c in columns]
             if out is None:
                 out = getattr(storage, create)(res, names=names,
-                                               expectedlen=nnz, **kwargs)
+                                               expectedlen=len(indices),
+                                               **kwargs)
             else:
                 out.append(res)
     return out
@@ -364,7 +538,9 @@ def take_table(tbl, indices, axis=None, out=None, mode='raise', blen=None, stora
         raise NotImplementedError('out argument is not supported')
     if mode is not None and mode != 'raise':
         raise NotImplementedError('only mode=raise is supported')
+    storage = _util.get_storage(storage)
     names, columns = _util.check_table_like(tbl)
+    blen = _util.get_blen_table(tbl, blen)
     length = len(columns[0])
 
     # check that indices are strictly increasing
@@ -373,12 +549,11 @@ def take_table(tbl, indices, axis=None, out=None, mode='raise', blen=None, stora
         raise NotImplementedError(
             'indices must be strictly increasing'
         )
+    if len(indices) and (indices[0] < 0 or indices[-1] >= length):
+        raise IndexError('index out of bounds')
 
-    # implement via compress()
-    condition = np.zeros((length,), dtype=bool)
-    condition[indices] = True
-    return compress_table(condition, tbl, blen=blen, storage=storage,
-                          create=create, **kwargs)
+    return _take_table_rows(names, columns, indices, blen, storage, create,
+                            **kwargs)
 
 
 def subset(data, sel0=None, sel1=None, blen=None, storage=None, create='array',
@@ -418,23 +593,45 @@ def subset(data, sel0=None, sel1=None, blen=None, storage=None, create='array',
         return take(data, sel1, axis=1, blen=blen, storage=storage,
                     create=create, **kwargs)
 
-    # build output
-    sel0_nnz = count_nonzero(sel0)
-    out = None
-    for i in range(0, length, blen):
-        j = min(i+blen, length)
-        bsel0 = sel0[i:j]
-        # don't access data unless we have to
-        if np.any(bsel0):
-            block = data[i:j]
-            res = _numpy_subset(block, bsel0, sel1)
-            if out is None:
-                out = getattr(storage, create)(res, expectedlen=sel0_nnz,
-                                               **kwargs)
-            else:
-                out.append(res)
+    # locate the selected rows within each block once up front, and only
+    # access the range of columns spanning the selection
+    sel0, = np.nonzero(sel0)
+    block_starts, splits = _block_splits(sel0, length, blen)
+    cols = slice(None)
+    if len(sel1) and 0 <= np.min(sel1) and np.max(sel1) < data.shape[1]:
+        cols = slice(np.min(sel1), np.max(sel1) + 1)
+        sel1 = sel1 - cols.start
+
+    def iter_blocks():
+        for k in range(len(block_starts) - 1):
+            bi, bj = splits[k], splits[k+1]
+            # don't access data unless we have to
+            if bj > bi:
+                i = block_starts[k]
+                j = min(i+blen, length)
+                yield np.asarray(data[i:j, cols]), sel0[bi:bj] - i
+
+    # where the column selection is made up of long runs of consecutive
+    # columns, gather each run as a contiguous slice, which is much faster than
+    # fancy indexing
+    runs = None
+    if cols.start is not None:
+        breaks = np.flatnonzero(np.diff(sel1) != 1) + 1
+        if len(sel1) >= 16 * (len(breaks) + 1):
+            starts = sel1[np.concatenate([[0], breaks])]
+            stops = sel1[np.concatenate([breaks, [len(sel1)]]) - 1] + 1
+            runs = list(zip(starts, stops))
+
+    def f(block, bsel0):
+        if runs is not None:
+            return np.concatenate([np.take(block[:, a:b], bsel0, axis=0)
+                                   for a, b in runs], axis=1)
+        # taking rows then columns is faster than indexing both at once
+        return np.take(np.take(block, bsel0, axis=0), sel1, axis=1)
 
-    return out
+    # build output
+    results = _util.starmap_blocks(f, iter_blocks())
+    return _store_blocks(results, storage, create, len(sel0), **kwargs)
 
 
 def concatenate_table(tup, blen=None, storage=None, create='table', **kwargs):
@@ -479,18 +676,16 @@ def concatenate(tup, axis=0, blen=None, storage=None, create='array', **kwargs):
 
     if axis == 0:
 
-        # build output
+        # build output, reading ahead while writing
+        def iter_blocks():
+            for a in tup:
+                ablen = _util.get_blen_array(a, blen)
+                for _, block in _util.iter_blocks(a, ablen):
+                    yield block
+
         expectedlen = sum(len(a) for a in tup)
-        out = None
-        for a in tup:
-            ablen = _util.get_blen_array(a, blen)
-            for i in range(0, len(a), ablen):
-                j = min(i+ablen, len(a))
-                block = a[i:j]
-                if out is None:
-                    out = getattr(storage, create)(block, expectedlen=expectedlen, **kwargs)
-                else:
-                    out.append(block)
+        out = _store_blocks(_util.read_ahead(iter_blocks()), storage, create,
+                            expectedlen, **kwargs)
 
     else:
 
@@ -573,17 +768,13 @@ def eval_table(tbl, expression, vm='python', blen=None, storage=None,
     blen = _util.get_blen_table(required_columns, blen=blen)
 
     # build output
-    out = None
-    for i in range(0, length, blen):
-        j = min(i+blen, length)
-        blocals = {v: c[i:j] for v, c in required_columns.items()}
-        res = evaluate(expression, local_dict=blocals, **vm_kwargs)
-        if out is None:
-            out = getattr(storage, create)(res, expectedlen=length, **kwargs)
-        else:
-            out.append(res)
+    def iter_results():
+        for i in range(0, length, blen):
+            j = min(i+blen, length)
+            blocals = {v: c[i:j] for v, c in required_columns.items()}
+            yield evaluate(expression, local_dict=blocals, **vm_kwargs)
 
-    return out
+    return _store_blocks(iter_results(), storage, create, length, **kwargs)
 
 
 class ChunkedArrayWrapper(ArrayWrapper):
@@ -597,10 +788,21 @@ class ChunkedArrayWrapper(ArrayWrapper):
 
     """
 
+    # maximum value over the whole array, cached because several methods (e.g.,
+    # count_alleles) need it and computing it requires a full scan of the data;
+    # only cached for arrays wrapping storage created by this library, as data
+    # passed in by the user may be modified through another handle
+    _max = None
+    _cache_max = False
+
     def __init__(self, data):
         data = _util.ensure_array_like(data)
         super(ChunkedArrayWrapper, self).__init__(data)
 
+    def __setitem__(self, item, value):
+        self._max = None
+        self.values[item] = value
+
     @property
     def caption(self):
         r = '<%s' % type(self).__name__
@@ -682,7 +884,22 @@ class ChunkedArrayWrapper(ArrayWrapper):
         out = copy(self, start=start, stop=stop, blen=blen, storage=storage,
                    create=create, **kwargs)
         # can always wrap this as sub-class
-        return type(self)(out)
+        out = type(self)(out)
+        if start == 0 and (stop is None or stop >= len(self)):
+            out._inherit_max(self)
+        else:
+            out._inherit_max()
+        return out
+
+    def _inherit_max(self, other=None):
+        # this array wraps newly created storage, so its maximum may be cached;
+        # if it also holds exactly the same values as `other`, then any maximum
+        # already computed for `other` also holds here, and need not be
+        # computed again by a full scan
+        self._cache_max = True
+        if (other is not None and other._max is not None and
+                other._max[0] == len(other) == len(self)):
+            self._max = other._max
 
     def binary_op(self, op, other, blen=None, storage=None, create='array',
                   **kwargs):
@@ -764,6 +981,11 @@ class ChunkedArrayWrapper(ArrayWrapper):
         return ChunkedArrayWrapper(out)
 
     def max(self, axis=None, **kwargs):
+        if axis is None and not kwargs and self._cache_max:
+            # N.B., length is also checked as data may have been appended
+            if self._max is None or self._max[0] != len(self):
+                self._max = len(self), amax(self)
+            return self._max[1]
         out = amax(self, axis=axis, **kwargs)
         if np.isscalar(out):
             return out
@@ -837,10 +1059,10 @@ class ChunkedTableWrapper(DisplayAsTable):
             stop = len(self) if item.stop is None else item.stop
             stop = min(stop, len(self))
             step = 1 if item.step is None else item.step
-            outshape = (stop - start) // step
+            outshape = len(range(start, stop, step))
             out = np.empty(outshape, dtype=self.dtype)
             for n, c in zip(self._names, self._columns):
-                out[n] = c[start:stop:step]
+                out[n] = _read_strided(c, start, stop, step)
             out = out.view(np.recarray)
             if self.array_cls is not None:
                 out = self.array_cls(out)
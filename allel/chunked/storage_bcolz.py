@@ -21,6 +21,21 @@ def _table_append(ctbl, data):
     ctbl.append_original(data)
 
 
+# compression parameters used by bcolz unless configured otherwise
+_bcolz_default_cparams = {'clevel': 5, 'shuffle': bcolz.SHUFFLE, 'cname': 'lz4',
+                          'quantize': 0}
+
+
+def _default_cparams(data):
+    # byte shuffle has no effect on 1-byte data (e.g., boolean arrays and
+    # genotype calls), whereas bit shuffle compresses it much better and
+    # faster; compression configured globally by the user via
+    # bcolz.defaults.cparams is left alone
+    if data.dtype.itemsize == 1 and bcolz.defaults.cparams == _bcolz_default_cparams:
+        return bcolz.cparams(cname='lz4', clevel=5, shuffle=bcolz.BITSHUFFLE)
+    return None
+
+
 class BcolzStorage(object):
     """Storage layer using bcolz carray and ctable."""
 
@@ -35,6 +50,9 @@ class BcolzStorage(object):
     def array(self, data, expectedlen=None, **kwargs):
         data = _util.ensure_array_like(data)
         kwargs = self._set_defaults(kwargs)
+        cparams = _default_cparams(data)
+        if cparams is not None:
+            kwargs.setdefault('cparams', cparams)
         return bcolz.carray(data, expectedlen=expectedlen, **kwargs)
 
     def table(self, data, names=None, expectedlen=None, **kwargs):
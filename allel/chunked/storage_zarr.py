@@ -5,12 +5,26 @@ import operator
 
 import zarr
 import zarr.util
+from numcodecs import Blosc
 
 
 from allel.chunked import util as _util
 from allel.compat import zip, reduce
 
 
+def align_chunklen(chunklen, blen):
+    if chunklen >= blen:
+        # use the nearest multiple of the block length
+        return blen * int(round(chunklen / blen))
+    else:
+        # use a divisor of the block length, if there is one nearby
+        k = -(-blen // chunklen)
+        for n in range(k, 2 * k + 1):
+            if blen % n == 0:
+                return blen // n
+        return chunklen
+
+
 def default_chunks(data, expectedlen):
     # here we will only ever chunk first dimension
     rowsize = data.dtype.itemsize
@@ -23,6 +37,10 @@ def default_chunks(data, expectedlen):
     else:
         # use zarr heuristics
         chunklen, = zarr.util.guess_chunks((expectedlen,), rowsize)
+        if 0 < len(data) < expectedlen:
+            # data is the first of several blocks to be appended, align chunks
+            # with blocks so that appends do not straddle chunk boundaries
+            chunklen = align_chunklen(chunklen, len(data))
     if data.ndim > 1:
         chunks = (chunklen,) + data.shape[1:]
     else:
@@ -54,6 +72,13 @@ class ZarrStorage(object):
         # determine chunks
         kwargs.setdefault('chunks', default_chunks(data, expectedlen))
 
+        # byte shuffle has no effect on 1-byte data (e.g., boolean arrays and
+        # genotype calls), whereas bit shuffle compresses it much better and
+        # faster; a default compressor configured by the user is left alone
+        if data.dtype.itemsize == 1 and zarr.storage.default_compressor == Blosc():
+            kwargs.setdefault('compressor', Blosc(cname='lz4', clevel=5,
+                                                  shuffle=Blosc.BITSHUFFLE))
+
         # create
         z = zarr.array(data, **kwargs)
 
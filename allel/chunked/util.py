@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, division
 import operator
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
 
 import numpy as np
 
 
-from allel.compat import string_types, reduce
+from allel.compat import string_types, reduce, queue
 
 
 storage_registry = dict()
@@ -120,6 +124,25 @@ def get_blen_array(data, blen=None):
         return blen
 
 
+def iter_blocks(data, blen, start=0, stop=None):
+    """Iterate over `data` in blocks of at most `blen` rows, yielding `(i,
+    block)` pairs where `i` is the index of the first row of the block.
+
+    Block boundaries are aligned to multiples of `blen`, so if `blen` is the
+    chunk length of the underlying storage then each block is decompressed
+    from exactly one chunk, even when `start` falls part-way through a chunk.
+
+    """
+
+    if stop is None:
+        stop = len(data)
+    i = start
+    while i < stop:
+        j = min((i // blen + 1) * blen, stop)
+        yield i, data[i:j]
+        i = j
+
+
 def get_blen_table(data, blen=None):
     if blen is None:
         _, columns = check_table_like(data)
@@ -210,3 +233,112 @@ def get_chunks(data):
         return data.chunks
     else:
         return None
+
+
+_thread_pool = None
+_thread_pool_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def get_thread_pool():
+    """Obtain the pool of threads used for block-wise computations, creating it
+    on first use."""
+    global _thread_pool
+    with _thread_pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPool(multiprocessing.cpu_count())
+    return _thread_pool
+
+
+def _run_in_worker(f, args):
+    _thread_local.worker = True
+    return f(*args)
+
+
+def prefetch_blocks(blocks, depth=2):
+    """Consume `blocks` in a background thread, yielding items in the same
+    order. Up to `depth` items are read ahead, so that reading (and
+    decompressing) the next blocks overlaps with whatever the caller does
+    with the current one."""
+
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        # give up if the consumer has gone away
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for block in blocks:
+                if not put((True, block)):
+                    return
+            put((False, None))
+        except Exception as e:
+            put((False, e))
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            ok, item = items.get()
+            if ok:
+                yield item
+            elif item is None:
+                return
+            else:
+                raise item
+    finally:
+        stop.set()
+
+
+def is_serial():
+    """Return True if block-wise computations will be run serially in the
+    current thread."""
+    # avoid deadlock from waiting on the pool from within the pool
+    return (multiprocessing.cpu_count() < 2 or
+            getattr(_thread_local, 'worker', False))
+
+
+def read_ahead(blocks):
+    """Iterate over `blocks`, reading ahead in a background thread unless
+    block-wise computations are being run serially."""
+    if is_serial():
+        return iter(blocks)
+    return prefetch_blocks(blocks)
+
+
+def starmap_blocks(f, blocks):
+    """Apply function `f` to each tuple of arguments in `blocks`, yielding
+    results in the same order as the input.
+
+    Computation is distributed over a pool of threads, which is worthwhile
+    because numpy and the compression libraries release the GIL. Blocks are
+    read ahead from `blocks` in a background thread, and only a bounded number
+    of blocks are held in memory at any one time. If called from within a
+    worker thread, or if only one CPU is available, blocks are processed
+    serially.
+
+    """
+
+    if is_serial():
+        for args in blocks:
+            yield f(*args)
+        return
+
+    n_threads = multiprocessing.cpu_count()
+    pool = get_thread_pool()
+    pending = deque()
+    for args in prefetch_blocks(blocks):
+        pending.append(pool.apply_async(_run_in_worker, (f, args)))
+        if len(pending) >= 2 * n_threads:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
@@ -10,6 +10,8 @@ from __future__ import absolute_import, print_function, division
 import gzip
 import os
 import re
+import struct
+import zlib
 from collections import namedtuple, defaultdict
 import warnings
 import time
@@ -22,6 +24,7 @@ import numpy as np
 
 
 from allel.compat import PY2, FileNotFoundError, text_type
+from allel.chunked.util import read_ahead
 from allel.opt.io_vcf_read import VCFChunkIterator, FileInputStream
 # expose some names from cython extension
 # noinspection PyUnresolvedReferences
@@ -149,6 +152,24 @@ def _chunk_iter_rename(it, rename_fields):
         yield renamed_chunk, chunk_length, chrom, pos
 
 
+def _concatenate_chunks(chunks, k):
+    # concatenate the arrays for field `k` from a list of chunks, removing them from
+    # the chunks as they are copied into the output
+    if len(chunks) == 1:
+        return chunks[0].pop(k)
+    arrays = [chunk[k] for chunk in chunks]
+    n = sum(len(a) for a in arrays)
+    out = np.empty((n,) + arrays[0].shape[1:], dtype=np.result_type(*arrays))
+    del arrays
+    offset = 0
+    for chunk in chunks:
+        a = chunk.pop(k)
+        out[offset:offset + len(a)] = a
+        offset += len(a)
+        del a
+    return out
+
+
 _doc_param_input = \
     """Path to VCF file on the local file system. May be uncompressed or gzip-compatible
         compressed file. May also be a file-like object (e.g., `io.BytesIO`)."""
@@ -208,10 +229,12 @@ _doc_param_region = \
         returned by this function."""
 
 _doc_param_tabix = \
-    """Name or path to tabix executable. Only required if `region` is given. Setting
-        `tabix` to `None` will cause a fall-back to scanning through the VCF file from
-        the beginning, which may be much slower than tabix but the only option if tabix
-        is not available on your system and/or the VCF file has not been tabix-indexed."""
+    """Name or path to tabix executable. Only required if `region` is given. If a
+        tabix ('.tbi') or CSI ('.csi') index file is found alongside the VCF file, the
+        index is read directly and the tabix executable is not used. Setting `tabix` to `None` will
+        cause a fall-back to scanning through the VCF file from the beginning, which may
+        be much slower than tabix but the only option if tabix is not available on your
+        system and/or the VCF file has not been tabix-indexed."""
 
 _doc_param_samples = \
     """Selection of samples to extract calldata for. If provided, should be a list of
@@ -334,9 +357,11 @@ def read_vcf(input,
         # find array keys
         keys = sorted(chunks[0].keys())
 
-        # concatenate chunks
+        # concatenate chunks, copying each chunk into the output and releasing it
+        # straight away, so memory for the output is only committed as the chunks
+        # are freed and peak memory stays close to the size of the output
         for k in keys:
-            output[k] = np.concatenate([chunk[k] for chunk in chunks], axis=0)
+            output[k] = _concatenate_chunks(chunks, k)
 
     else:
 
@@ -987,8 +1012,9 @@ def vcf_to_zarr(input, output,
     # store first chunk
     _zarr_store_chunk(root, keys, chunk)
 
-    # store remaining chunks
-    for chunk, _, _, _ in it:
+    # store remaining chunks, parsing ahead in a background thread so that parsing
+    # overlaps with compression, which releases the GIL
+    for chunk, _, _, _ in read_ahead(it):
 
         _zarr_store_chunk(root, keys, chunk)
 
@@ -1015,6 +1041,185 @@ vcf_to_zarr.__doc__ = vcf_to_zarr.__doc__.format(
 )
 
 
+def _read_tabix_index(path):
+    """Read a tabix (.tbi) or CSI (.csi) index, returning a tuple `(min_shift, depth,
+    refs)`, where `min_shift` and `depth` describe the binning scheme and `refs` is a
+    dict mapping sequence names to a tuple `(bins, linear)`, where `bins` maps bin
+    numbers to lists of `(begin, end)` virtual file offsets and `linear` is the list of
+    linear index offsets (always empty for CSI indexes)."""
+
+    with gzip.open(path, mode='rb') as f:
+        data = f.read()
+
+    csi = data[:4] == b'CSI\1'
+    if csi:
+        # the tabix header is stored as auxiliary data
+        min_shift, depth, l_aux = struct.unpack_from('<iii', data, 4)
+        if l_aux < 28:
+            raise ValueError('CSI index has no sequence names: %r' % path)
+        header = 16
+        n_ref = struct.unpack_from('<i', data, header + l_aux)[0]
+        offset = header + l_aux + 4
+    elif data[:4] == b'TBI\1':
+        min_shift, depth = 14, 5
+        n_ref = struct.unpack_from('<i', data, 4)[0]
+        header = 8
+    else:
+        raise ValueError('not a tabix index: %r' % path)
+
+    # sequence names follow the column and meta-character settings
+    l_nm = struct.unpack_from('<i', data, header + 24)[0]
+    names = data[header + 28:header + 28 + l_nm].split(b'\0')[:n_ref]
+    if not csi:
+        offset = header + 28 + l_nm
+
+    refs = dict()
+    for name in names:
+        bins = dict()
+        n_bin = struct.unpack_from('<i', data, offset)[0]
+        offset += 4
+        for _ in range(n_bin):
+            if csi:
+                # N.B., the offset of the first record in the bin is not used
+                b, _, n_chunk = struct.unpack_from('<IQi', data, offset)
+                offset += 16
+            else:
+                b, n_chunk = struct.unpack_from('<Ii', data, offset)
+                offset += 8
+            chunks = struct.unpack_from('<%sQ' % (2 * n_chunk), data, offset)
+            offset += 16 * n_chunk
+            bins[b] = list(zip(chunks[::2], chunks[1::2]))
+        linear = ()
+        if not csi:
+            n_intv = struct.unpack_from('<i', data, offset)[0]
+            offset += 4
+            linear = struct.unpack_from('<%sQ' % n_intv, data, offset)
+            offset += 8 * n_intv
+        refs[name] = bins, linear
+
+    return min_shift, depth, refs
+
+
+def _tabix_reg2bins(begin, end, min_shift=14, depth=5):
+    # bins overlapping the zero-based, half-open interval [begin, end), see the tabix
+    # and CSI specifications
+    end -= 1
+    bins = []
+    first = 0
+    shift = min_shift + 3 * depth
+    for level in range(depth + 1):
+        bins.extend(range(first + (begin >> shift), first + (end >> shift) + 1))
+        first += 1 << (3 * level)
+        shift -= 3
+    return bins
+
+
+def _tabix_region_chunks(index, region):
+    """Find the virtual file offsets of the BGZF data overlapping `region`, returning a
+    sorted list of non-overlapping `(begin, end)` pairs."""
+
+    min_shift, depth, refs = index
+    max_end = 1 << (min_shift + 3 * depth)
+    tokens = region.split(':')
+    chrom = tokens[0].encode('utf8')
+    if len(tokens) > 1:
+        begin, end = tokens[1].split('-')
+        # convert to zero-based, half-open
+        begin, end = int(begin) - 1, int(end)
+    else:
+        begin, end = 0, max_end
+    begin, end = max(begin, 0), min(end, max_end)
+
+    if chrom not in refs:
+        return []
+    bins, linear = refs[chrom]
+
+    # use the linear index to skip chunks that end before the region starts
+    min_offset = 0
+    if linear:
+        min_offset = linear[min(begin >> 14, len(linear) - 1)]
+
+    chunks = sorted(c for b in _tabix_reg2bins(begin, end, min_shift, depth)
+                    for c in bins.get(b, ()) if c[1] > min_offset)
+
+    # merge overlapping chunks
+    merged = []
+    for chunk_begin, chunk_end in chunks:
+        if merged and chunk_begin <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], chunk_end)
+        else:
+            merged.append([chunk_begin, chunk_end])
+    return [tuple(c) for c in merged]
+
+
+class _TabixRegionReader(object):
+    """File-like object providing the header lines of a bgzip-compressed VCF file
+    followed by the lines within a region, located via the tabix index."""
+
+    def __init__(self, path, index_path, region):
+        chunks = _tabix_region_chunks(_read_tabix_index(index_path), region)
+        self.fileobj = open(path, mode='rb')
+        self.blocks = self._iter_blocks(chunks)
+        self.buffer = memoryview(b'')
+
+    def _read_block(self, offset):
+        # read and decompress the BGZF block starting at file offset `offset`,
+        # returning the uncompressed data and the offset of the next block
+        self.fileobj.seek(offset)
+        header = self.fileobj.read(18)
+        if len(header) < 18:
+            return b'', offset
+        block_size = struct.unpack_from('<H', header, 16)[0] + 1
+        cdata = self.fileobj.read(block_size - 18)
+        return zlib.decompress(cdata[:-8], -15), offset + block_size
+
+    def _iter_header(self):
+        # yield header lines from the start of the file
+        offset = 0
+        line = b''
+        while True:
+            data, offset = self._read_block(offset)
+            if not data:
+                break
+            lines = (line + data).split(b'\n')
+            line = lines.pop()
+            for x in lines:
+                if not x.startswith(b'#'):
+                    return
+                yield x + b'\n'
+        if line.startswith(b'#'):
+            yield line
+
+    def _iter_blocks(self, chunks):
+        for x in self._iter_header():
+            yield x
+        for begin, end in chunks:
+            offset, skip = begin >> 16, begin & 0xffff
+            end_offset, end_skip = end >> 16, end & 0xffff
+            while offset <= end_offset:
+                data, next_offset = self._read_block(offset)
+                if not data:
+                    break
+                if offset == end_offset:
+                    data = data[:end_skip]
+                yield data[skip:]
+                offset, skip = next_offset, 0
+
+    def readinto(self, b):
+        while not self.buffer:
+            try:
+                self.buffer = memoryview(next(self.blocks))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self):
+        self.fileobj.close()
+
+
 # noinspection PyShadowingBuiltins
 def _setup_input_stream(input, region=None, tabix=None, buffer_size=DEFAULT_BUFFER_SIZE):
 
@@ -1022,7 +1227,30 @@ def _setup_input_stream(input, region=None, tabix=None, buffer_size=DEFAULT_BUFF
     close = False
     if isinstance(input, str) and input.endswith('gz'):
 
-        if region and tabix and os.name != 'nt':
+        index_path = None
+        if region and tabix:
+            for ext in '.tbi', '.csi':
+                if os.path.exists(input + ext):
+                    index_path = input + ext
+                    break
+
+        if index_path:
+
+            try:
+                # read the region directly via the tabix index, avoiding the overhead
+                # of running tabix in a subprocess
+                fileobj = _TabixRegionReader(input, index_path, region)
+                # N.B., still pass the region parameter through so we get strictly
+                # only variants that start within the requested region
+
+            except Exception as e:
+                warnings.warn('error occurred reading tabix index (%s); falling back to '
+                              'scanning to region' % e)
+                fileobj = gzip.open(input, mode='rb')
+
+            close = True
+
+        elif region and tabix and os.name != 'nt':
 
             try:
                 # try tabix
@@ -1276,45 +1504,35 @@ def _add_all_variants_fields(fields, headers):
 
 def _add_all_fixed_variants_fields(fields):
     for k in FIXED_VARIANTS_FIELDS:
-        f = 'variants/' + k
-        if f not in fields:
-            fields.append(f)
+        fields.append('variants/' + k)
 
 
 def _add_all_info_fields(fields, headers):
     for k in headers.infos:
-        f = 'variants/' + k
-        if f not in fields:
-            fields.append(f)
+        fields.append('variants/' + k)
 
 
 def _add_all_filter_fields(fields, headers):
     fields.append('variants/FILTER_PASS')
     for k in headers.filters:
-        f = 'variants/FILTER_' + k
-        if f not in fields:
-            fields.append(f)
+        fields.append('variants/FILTER_' + k)
 
 
 def _add_all_computed_fields(fields):
     for k in COMPUTED_FIELDS:
-        f = 'variants/' + k
-        if f not in fields:
-            fields.append(f)
+        fields.append('variants/' + k)
 
 
 def _add_all_calldata_fields(fields, headers):
     # only add calldata fields if there are samples
     if headers.samples:
         for k in headers.formats:
-            f = 'calldata/' + k
-            if f not in fields:
-                fields.append(f)
+            fields.append('calldata/' + k)
 
 
 def _normalize_fields(fields, headers, samples):
 
-    # setup normalized fields
+    # setup normalized fields, may contain duplicates until the end
     normed_fields = list()
 
     # special case, single field specification
@@ -1352,9 +1570,12 @@ def _normalize_fields(fields, headers, samples):
             if f.startswith('calldata/') and len(samples) == 0:
                 # only add calldata fields if there are samples
                 pass
-            elif f not in normed_fields:
+            else:
                 normed_fields.append(f)
 
+    # remove duplicates, preserving order
+    normed_fields = list(OrderedDict.fromkeys(normed_fields))
+
     return normed_fields
 
 
@@ -1709,19 +1930,19 @@ def read_vcf_headers(input):
 def _read_vcf_headers(stream):
 
     # setup
-    headers = []
     samples = None
     filters = dict()
     infos = dict()
     formats = dict()
 
-    # read first header line
-    header = stream.readline()
-    header = text_type(header, 'utf8')
-
-    while header and header[0] == '#':
+    # read and decode all header lines in one go
+    lines = text_type(stream.read_headers(), 'utf8').split('\n')
+    headers = [line + '\n' for line in lines[:-1]]
+    if lines[-1]:
+        # last line not terminated
+        headers.append(lines[-1])
 
-        headers.append(header)
+    for header in headers:
 
         if header.startswith('##FILTER'):
 
@@ -1762,10 +1983,6 @@ def _read_vcf_headers(stream):
             samples = header.strip().split('\t')[9:]
             break
 
-        # read next header line
-        header = stream.readline()
-        header = text_type(header, 'utf8')
-
     # check if we saw the mandatory header line or not
     if samples is None:
         # can't warn about this, it's fatal
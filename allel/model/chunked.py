@@ -201,39 +201,54 @@ class GenotypeChunkedArray(ChunkedArrayWrapper, DisplayAs2D):
         if kwargs is None:
             kwargs = dict()
 
-        def mapper(block):
+        # count each block directly rather than summing a boolean array, so the
+        # numpy count methods can avoid materialising the intermediate
+        def reducer(block, axis):
+            if axis is not None and len(axis) == 1:
+                axis = axis[0]
             method = getattr(block, method_name)
-            return method(**kwargs)
-        out = self.sum(axis=axis, mapper=mapper, **storage_kwargs)
-        return out
+            out = method(axis=axis, **kwargs)
+            if axis == 1:
+                # counts per variant are bounded by the number of samples, so
+                # can be stored compactly
+                out = out.astype('i4', copy=False)
+            return out
+        out = _chunked.reduce_axis(self, reducer=reducer, block_reducer=np.add,
+                                   axis=axis, **storage_kwargs)
+        if np.isscalar(out):
+            return out
+        else:
+            return ChunkedArrayWrapper(out)
 
     def count_called(self, axis=None, **kwargs):
-        return self._count('is_called', axis, **kwargs)
+        return self._count('count_called', axis, **kwargs)
 
     def count_missing(self, axis=None, **kwargs):
-        return self._count('is_missing', axis, **kwargs)
+        return self._count('count_missing', axis, **kwargs)
 
     def count_hom(self, allele=None, axis=None, **kwargs):
-        return self._count('is_hom', axis, kwargs=dict(allele=allele),
+        return self._count('count_hom', axis, kwargs=dict(allele=allele),
                            **kwargs)
 
     def count_hom_ref(self, axis=None, **kwargs):
-        return self._count('is_hom_ref', axis, **kwargs)
+        return self._count('count_hom_ref', axis, **kwargs)
 
     def count_hom_alt(self, axis=None, **kwargs):
-        return self._count('is_hom_alt', axis, **kwargs)
+        return self._count('count_hom_alt', axis, **kwargs)
 
     def count_het(self, allele=None, axis=None, **kwargs):
-        return self._count('is_het', axis, kwargs=dict(allele=allele),
+        return self._count('count_het', axis, kwargs=dict(allele=allele),
                            **kwargs)
 
     def count_call(self, call, axis=None, **kwargs):
-        return self._count('is_call', axis, kwargs=dict(call=call),
+        return self._count('count_call', axis, kwargs=dict(call=call),
                            **kwargs)
 
     def to_haplotypes(self, **kwargs):
         out = self.map_blocks_method('to_haplotypes', **kwargs)
-        return HaplotypeChunkedArray(out)
+        out = HaplotypeChunkedArray(out)
+        out._inherit_max(self)
+        return out
 
     def to_n_ref(self, fill=0, dtype='i1', **kwargs):
         out = self.map_blocks_method('to_n_ref', kwargs=dict(fill=fill, dtype=dtype),
@@ -386,7 +401,9 @@ class HaplotypeChunkedArray(ChunkedArrayWrapper, DisplayAs2D):
             return block.to_genotypes(ploidy)
 
         out = self.map_blocks(f, **kwargs)
-        return GenotypeChunkedArray(out)
+        out = GenotypeChunkedArray(out)
+        out._inherit_max(self)
+        return out
 
     def is_called(self, **kwargs):
         return self.__ge__(0, **kwargs)
@@ -410,8 +427,19 @@ class HaplotypeChunkedArray(ChunkedArrayWrapper, DisplayAs2D):
         def mapper(block):
             method = getattr(block, method_name)
             return method(**kwargs)
-        out = self.sum(axis=axis, mapper=mapper, **storage_kwargs)
-        return out
+
+        def reducer(block, axis):
+            if axis == (1,):
+                # counts per variant are bounded by the number of haplotypes,
+                # so can be stored compactly
+                return np.sum(block, axis=axis, dtype='i4')
+            return np.sum(block, axis=axis)
+        out = _chunked.reduce_axis(self, reducer=reducer, block_reducer=np.add,
+                                   mapper=mapper, axis=axis, **storage_kwargs)
+        if np.isscalar(out):
+            return out
+        else:
+            return ChunkedArrayWrapper(out)
 
     def count_called(self, axis=None, **kwargs):
         return self._count('is_called', axis=axis, **kwargs)
@@ -581,7 +609,7 @@ class AlleleCountsChunkedArray(ChunkedArrayWrapper, DisplayAs2D):
         def mapper(block):
             method = getattr(block, method_name)
             return method(**kwargs)
-        out = self.sum(mapper=mapper, **storage_kwargs)
+        out = _chunked.count_nonzero(self, mapper=mapper, **storage_kwargs)
         return out
 
     def count_variant(self, **kwargs):
@@ -19,8 +19,11 @@ from allel.abc import ArrayWrapper, DisplayAs1D, DisplayAs2D, DisplayAsTable
 from allel.opt.model import genotype_array_pack_diploid, genotype_array_unpack_diploid, \
     genotype_array_count_alleles, genotype_array_count_alleles_masked, \
     genotype_array_count_alleles_subpop, genotype_array_count_alleles_subpop_masked, \
-    haplotype_array_count_alleles, haplotype_array_count_alleles_subpop, \
-    haplotype_array_map_alleles, allele_counts_array_map_alleles
+    genotype_array_count_alleles_subpops, haplotype_array_count_alleles, \
+    haplotype_array_count_alleles_subpop, haplotype_array_count_alleles_subpops, \
+    haplotype_array_map_alleles, allele_counts_array_map_alleles, genotype_array_match, \
+    genotype_array_count, genotype_array_to_n_allele, genotype_array_to_allele_counts, \
+    GT_CALLED, GT_MISSING, GT_HOM, GT_HOM_ALLELE, GT_HOM_ALT, GT_HET, GT_HET_ALLELE, GT_CALL
 from .generic import index_genotype_vector, compress_genotypes, \
     take_genotypes, concatenate_genotypes, index_genotype_array, subset_genotype_array, \
     index_haplotype_array, compress_haplotype_array, take_haplotype_array, \
@@ -379,6 +382,12 @@ class Genotypes(NumpyArrayWrapper):
 
         return out
 
+    def _split_ploidy(self):
+        # views of the first and second allele of each diploid call, which
+        # allow comparisons between alleles to be made element-wise rather
+        # than by reducing over the short trailing ploidy dimension
+        return self.values[..., 0], self.values[..., 1]
+
     def is_called(self):
         """Find non-missing genotype calls.
 
@@ -408,7 +417,10 @@ class Genotypes(NumpyArrayWrapper):
 
         """
 
-        out = np.all(self.values >= 0, axis=-1)
+        if self.ndim == 3:
+            out = self._match_fused(GT_CALLED)
+        else:
+            out = np.all(self.values >= 0, axis=-1)
 
         # handle mask
         if self.mask is not None:
@@ -445,7 +457,10 @@ class Genotypes(NumpyArrayWrapper):
 
         """
 
-        out = np.any(self.values < 0, axis=-1)
+        if self.ndim == 3:
+            out = self._match_fused(GT_MISSING)
+        else:
+            out = np.any(self.values < 0, axis=-1)
 
         # handle mask
         if self.mask is not None:
@@ -489,13 +504,31 @@ class Genotypes(NumpyArrayWrapper):
         >>> v.is_hom()
         array([ True, False,  True])
 
+        Notes
+        -----
+        Missing calls are never homozygous. For haploid data, every
+        non-missing call is homozygous.
+
         """
 
-        if allele is None:
-            allele1 = self.values[..., 0, np.newaxis]
+        if self.ndim == 3:
+            if allele is None:
+                out = self._match_fused(GT_HOM)
+            else:
+                out = self._match_fused(GT_HOM_ALLELE, allele=allele)
+        elif self.ploidy == 2:
+            a0, a1 = self._split_ploidy()
+            if allele is None:
+                out = (a0 >= 0) & (a0 == a1)
+            else:
+                out = (a0 == allele) & (a1 == allele)
+        elif allele is None:
+            # N.B., check the first allele separately, so haploid missing
+            # calls are not found to be homozygous
+            allele1 = self.values[..., 0]
             other_alleles = self.values[..., 1:]
-            tmp = (allele1 >= 0) & (allele1 == other_alleles)
-            out = np.all(tmp, axis=-1)
+            tmp = allele1[..., np.newaxis] == other_alleles
+            out = (allele1 >= 0) & np.all(tmp, axis=-1)
         else:
             out = np.all(self.values == allele, axis=-1)
 
@@ -564,12 +597,23 @@ class Genotypes(NumpyArrayWrapper):
         >>> v.is_hom_alt()
         array([False,  True, False])
 
+        Notes
+        -----
+        Missing calls are never homozygous. For haploid data, every call of an
+        alternate allele is homozygous.
+
         """
 
-        allele1 = self.values[..., 0, np.newaxis]
-        other_alleles = self.values[..., 1:]
-        tmp = (allele1 > 0) & (allele1 == other_alleles)
-        out = np.all(tmp, axis=-1)
+        if self.ndim == 3:
+            out = self._match_fused(GT_HOM_ALT)
+        elif self.ploidy == 2:
+            a0, a1 = self._split_ploidy()
+            out = (a0 > 0) & (a0 == a1)
+        else:
+            allele1 = self.values[..., 0]
+            other_alleles = self.values[..., 1:]
+            tmp = allele1[..., np.newaxis] == other_alleles
+            out = (allele1 > 0) & np.all(tmp, axis=-1)
 
         # handle mask
         if self.mask is not None:
@@ -612,11 +656,22 @@ class Genotypes(NumpyArrayWrapper):
 
         """
 
-        allele1 = self.values[..., 0, np.newaxis]  # type: np.ndarray
-        other_alleles = self.values[..., 1:]  # type: np.ndarray
-        out = np.all(self.values >= 0, axis=-1) & np.any(allele1 != other_alleles, axis=-1)
-        if allele is not None:
-            out &= np.any(self.values == allele, axis=-1)
+        if self.ndim == 3:
+            if allele is None:
+                out = self._match_fused(GT_HET)
+            else:
+                out = self._match_fused(GT_HET_ALLELE, allele=allele)
+        elif self.ploidy == 2:
+            a0, a1 = self._split_ploidy()
+            out = (a0 >= 0) & (a1 >= 0) & (a0 != a1)
+            if allele is not None:
+                out &= (a0 == allele) | (a1 == allele)
+        else:
+            allele1 = self.values[..., 0, np.newaxis]  # type: np.ndarray
+            other_alleles = self.values[..., 1:]  # type: np.ndarray
+            out = np.all(self.values >= 0, axis=-1) & np.any(allele1 != other_alleles, axis=-1)
+            if allele is not None:
+                out &= np.any(self.values == allele, axis=-1)
 
         # handle mask
         if self.mask is not None:
@@ -659,13 +714,13 @@ class Genotypes(NumpyArrayWrapper):
 
         # guard conditions
         if not len(call) == self.shape[-1]:
-            raise ValueError('invalid call ploidy: %s', repr(call))
+            raise ValueError('invalid call ploidy: %r' % (call,))
 
         if self.ndim == 2:
             call = np.asarray(call)[np.newaxis, :]
+            out = np.all(self.values == call, axis=-1)
         else:
-            call = np.asarray(call)[np.newaxis, np.newaxis, :]
-        out = np.all(self.values == call, axis=-1)
+            out = self._match_fused(GT_CALL, call=call)
 
         # handle mask
         if self.mask is not None:
@@ -673,6 +728,33 @@ class Genotypes(NumpyArrayWrapper):
 
         return out
 
+    def _match_fused(self, condition, allele=0, call=None):
+        # find matching calls in a single pass over the data, for arrays only
+        if call is not None:
+            call = np.asarray(call, dtype='i8')
+        values = memoryview_safe(self.values)
+        return genotype_array_match(values, condition, allele=allele, call=call)
+
+    def _can_count_fused(self, axis):
+        # calls can be counted in a single pass without materialising a boolean
+        # array
+        return self.ndim == 3 and axis in (None, 0, 1)
+
+    def _count_fused(self, condition, axis, allele=0, call=None):
+        if call is not None:
+            if len(call) != self.ploidy:
+                raise ValueError('invalid call ploidy: %r' % (call,))
+            call = np.asarray(call, dtype='i8')
+        values = memoryview_safe(self.values)
+        mask = self.mask
+        if mask is not None:
+            mask = memoryview_safe(mask).view('u1')
+        out = genotype_array_count(values, condition, 1 if axis is None else axis,
+                                   allele=allele, call=call, mask=mask)
+        if axis is None:
+            out = out.sum()
+        return out
+
     def count_called(self, axis=None):
         """Count called genotypes.
 
@@ -682,6 +764,8 @@ class Genotypes(NumpyArrayWrapper):
             Axis over which to count, or None to perform overall count.
 
         """
+        if self._can_count_fused(axis):
+            return self._count_fused(GT_CALLED, axis)
         b = self.is_called()
         return np.sum(b, axis=axis)
 
@@ -694,6 +778,8 @@ class Genotypes(NumpyArrayWrapper):
             Axis over which to count, or None to perform overall count.
 
         """
+        if self._can_count_fused(axis):
+            return self._count_fused(GT_MISSING, axis)
         b = self.is_missing()
         return np.sum(b, axis=axis)
 
@@ -708,6 +794,10 @@ class Genotypes(NumpyArrayWrapper):
             Axis over which to count, or None to perform overall count.
 
         """
+        if self._can_count_fused(axis):
+            if allele is None:
+                return self._count_fused(GT_HOM, axis)
+            return self._count_fused(GT_HOM_ALLELE, axis, allele=allele)
         b = self.is_hom(allele=allele)
         return np.sum(b, axis=axis)
 
@@ -720,6 +810,8 @@ class Genotypes(NumpyArrayWrapper):
             Axis over which to count, or None to perform overall count.
 
         """
+        if self._can_count_fused(axis):
+            return self._count_fused(GT_HOM_ALLELE, axis, allele=0)
         b = self.is_hom_ref()
         return np.sum(b, axis=axis)
 
@@ -732,6 +824,8 @@ class Genotypes(NumpyArrayWrapper):
             Axis over which to count, or None to perform overall count.
 
         """
+        if self._can_count_fused(axis):
+            return self._count_fused(GT_HOM_ALT, axis)
         b = self.is_hom_alt()
         return np.sum(b, axis=axis)
 
@@ -746,6 +840,10 @@ class Genotypes(NumpyArrayWrapper):
             Axis over which to count, or None to perform overall count.
 
         """
+        if self._can_count_fused(axis):
+            if allele is None:
+                return self._count_fused(GT_HET, axis)
+            return self._count_fused(GT_HET_ALLELE, axis, allele=allele)
         b = self.is_het(allele=allele)
         return np.sum(b, axis=axis)
 
@@ -760,9 +858,25 @@ class Genotypes(NumpyArrayWrapper):
             Axis over which to count, or None to perform overall count.
 
         """
+        if self._can_count_fused(axis):
+            return self._count_fused(GT_CALL, axis, call=call)
         b = self.is_call(call=call)
         return np.sum(b, axis=axis)
 
+    def _can_to_n_fused(self, fill, dtype):
+        # alleles can be counted and calls filled in a single pass for arrays,
+        # as long as the output is int8; if there are no calls to fill, the
+        # element-wise path is just as fast
+        return (self.ndim == 3 and np.dtype(dtype) == np.int8 and
+                fill in range(-128, 128) and (fill != 0 or self.mask is not None))
+
+    def _to_n_fused(self, alt, fill):
+        values = memoryview_safe(self.values)
+        mask = self.mask
+        if mask is not None:
+            mask = memoryview_safe(mask).view('u1')
+        return genotype_array_to_n_allele(values, alt, fill=fill, mask=mask)
+
     def to_n_ref(self, fill=0, dtype='i1'):
         """Transform each genotype call into the number of
         reference alleles.
@@ -809,9 +923,16 @@ class Genotypes(NumpyArrayWrapper):
 
         """
 
-        # count number of alternate alleles
+        if self._can_to_n_fused(fill, dtype):
+            return self._to_n_fused(alt=False, fill=fill)
+
+        # count number of reference alleles
         out = np.empty(self.shape[:-1], dtype=dtype)
-        np.sum(self.values == 0, axis=-1, out=out)
+        if self.ploidy == 2:
+            a0, a1 = self._split_ploidy()
+            np.add(a0 == 0, a1 == 0, out=out, dtype=out.dtype)
+        else:
+            np.sum(self.values == 0, axis=-1, out=out)
 
         # fill missing calls
         if fill != 0:
@@ -874,9 +995,16 @@ class Genotypes(NumpyArrayWrapper):
 
         """
 
+        if self._can_to_n_fused(fill, dtype):
+            return self._to_n_fused(alt=True, fill=fill)
+
         # count number of alternate alleles
         out = np.empty(self.shape[:-1], dtype=dtype)
-        np.sum(self.values > 0, axis=-1, out=out)
+        if self.ploidy == 2:
+            a0, a1 = self._split_ploidy()
+            np.add(a0 > 0, a1 > 0, out=out, dtype=out.dtype)
+        else:
+            np.sum(self.values > 0, axis=-1, out=out)
 
         # fill missing calls
         if fill != 0:
@@ -931,16 +1059,26 @@ class Genotypes(NumpyArrayWrapper):
             max_allele = self.max()
         alleles = list(range(max_allele + 1))
 
-        # set up output array
-        outshape = self.shape[:-1] + (len(alleles),)
-        out = np.zeros(outshape, dtype=dtype)
+        if self.ndim == 3 and np.dtype(dtype) == np.uint8 and max_allele >= 0:
+            # count all alleles in a single pass
+            values = memoryview_safe(self.values)
+            mask = self.mask
+            if mask is not None:
+                mask = memoryview_safe(mask).view('u1')
+            out = genotype_array_to_allele_counts(values, max_allele, mask=mask)
+
+        else:
 
-        for allele in alleles:
-            # count alleles along ploidy dimension
-            allele_match = self.values == allele
-            if self.mask is not None:
-                allele_match &= ~self.mask[..., np.newaxis]
-            np.sum(allele_match, axis=-1, out=out[..., allele])
+            # set up output array
+            outshape = self.shape[:-1] + (len(alleles),)
+            out = np.zeros(outshape, dtype=dtype)
+
+            for allele in alleles:
+                # count alleles along ploidy dimension
+                allele_match = self.values == allele
+                if self.mask is not None:
+                    allele_match &= ~self.mask[..., np.newaxis]
+                np.sum(allele_match, axis=-1, out=out[..., allele])
 
         if self.ndim == 2:
             out = GenotypeAlleleCountsVector(out)
@@ -1354,6 +1492,21 @@ def _normalize_subpop_arg(subpop, n):
     return subpop
 
 
+def _normalize_subpops_arg(subpops, n):
+    # map each sample to the subpopulations it belongs to, in compressed sparse
+    # row form, so allele counts for all subpopulations can be made in a single
+    # pass over the data
+    names = list(subpops.keys())
+    indices = [np.asarray(_normalize_subpop_arg(subpops[name], n)) for name in names]
+    samples = np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+    members = np.repeat(np.arange(len(names), dtype=np.int64),
+                        [len(idx) for idx in indices])
+    members = members[np.argsort(samples, kind='mergesort')]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(samples, minlength=n), out=offsets[1:])
+    return names, offsets, members
+
+
 class GenotypeArray(Genotypes, DisplayAs2D):
     """Array of discrete genotype calls for a matrix of variants and samples.
 
@@ -1587,17 +1740,9 @@ class GenotypeArray(Genotypes, DisplayAs2D):
 
         check_ploidy(self.ploidy, 2)
 
-        if boundscheck:
-            amx = self.max()
-            if amx > 14:
-                raise ValueError('max allele for packing is 14, found %s' % amx)
-            amn = self.min()
-            if amn < -1:
-                raise ValueError('min allele for packing is -1, found %s' % amn)
-
-        # pack data
-        values = memoryview_safe(self.values)
-        packed = genotype_array_pack_diploid(values)
+        # pack data, checking bounds in the same pass
+        values = memoryview_safe(np.ascontiguousarray(self.values))
+        packed = genotype_array_pack_diploid(values, boundscheck=boundscheck)
 
         return packed
 
@@ -1636,7 +1781,7 @@ class GenotypeArray(Genotypes, DisplayAs2D):
         packed = np.asarray(packed)
         check_ndim(packed, 2)
         check_dtype(packed, 'u1')
-        packed = memoryview_safe(packed)
+        packed = memoryview_safe(np.ascontiguousarray(packed))
 
         data = genotype_array_unpack_diploid(packed)
         return cls(data)
@@ -1873,8 +2018,18 @@ class GenotypeArray(Genotypes, DisplayAs2D):
         if max_allele is None:
             max_allele = self.max()
 
-        out = {name: self.count_alleles(max_allele=max_allele, subpop=subpop)
-               for name, subpop in subpops.items()}
+        if self.mask is not None or any(subpop is None for subpop in subpops.values()):
+            out = {name: self.count_alleles(max_allele=max_allele, subpop=subpop)
+                   for name, subpop in subpops.items()}
+
+        else:
+            # count all subpopulations in a single pass
+            names, offsets, members = _normalize_subpops_arg(subpops, self.shape[1])
+            values = memoryview_safe(self.values)
+            ac = genotype_array_count_alleles_subpops(values, max_allele, offsets, members,
+                                                      len(names))
+            out = {name: AlleleCountsArray(ac[i], copy=False)
+                   for i, name in enumerate(names)}
 
         return out
 
@@ -2424,8 +2579,18 @@ class HaplotypeArray(NumpyArrayWrapper, DisplayAs2D):
         if max_allele is None:
             max_allele = self.max()
 
-        out = {name: self.count_alleles(max_allele=max_allele, subpop=subpop)
-               for name, subpop in subpops.items()}
+        if any(subpop is None for subpop in subpops.values()):
+            out = {name: self.count_alleles(max_allele=max_allele, subpop=subpop)
+                   for name, subpop in subpops.items()}
+
+        else:
+            # count all subpopulations in a single pass
+            names, offsets, members = _normalize_subpops_arg(subpops, self.shape[1])
+            values = memoryview_safe(self.values)
+            ac = haplotype_array_count_alleles_subpops(values, max_allele, offsets, members,
+                                                       len(names))
+            out = {name: AlleleCountsArray(ac[i], copy=False)
+                   for i, name in enumerate(names)}
 
         return out
 
@@ -2709,7 +2874,17 @@ class AlleleCountsArray(NumpyArrayWrapper, DisplayAs2D):
 
         """
 
-        return np.sum(self.values > 0, axis=1)
+        return self._allelism().astype(int, copy=False)
+
+    def _allelism(self):
+        # accumulate column-wise, which is much faster than numpy reducing over
+        # the short alleles dimension; use a compact accumulator where it cannot
+        # overflow, which is faster still
+        dtype = 'i1' if self.shape[1] < 128 else int
+        out = np.zeros(self.shape[0], dtype=dtype)
+        for i in range(self.shape[1]):
+            out += self.values[:, i] > 0
+        return out
 
     def max_allele(self):
         """Return the highest allele index for each variant.
@@ -2762,8 +2937,10 @@ class AlleleCountsArray(NumpyArrayWrapper, DisplayAs2D):
 
         """
 
-        t = self.values[:, 1:] > 0  # type: np.ndarray
-        return np.any(t, axis=1)
+        out = np.zeros(self.shape[0], dtype=bool)
+        for i in range(1, self.shape[1]):
+            out |= self.values[:, i] > 0
+        return out
 
     def is_non_variant(self):
         """Find variants with no non-reference allele calls.
@@ -2788,8 +2965,10 @@ class AlleleCountsArray(NumpyArrayWrapper, DisplayAs2D):
 
         """
 
-        t = self.values[:, 1:] == 0  # type: np.ndarray
-        return np.all(t, axis=1)
+        out = np.ones(self.shape[0], dtype=bool)
+        for i in range(1, self.shape[1]):
+            out &= self.values[:, i] == 0
+        return out
 
     def is_segregating(self):
         """Find segregating variants (where more than one allele is observed).
@@ -2814,7 +2993,7 @@ class AlleleCountsArray(NumpyArrayWrapper, DisplayAs2D):
 
         """
 
-        return self.allelism() > 1
+        return self._allelism() > 1
 
     def is_non_segregating(self, allele=None):
         """Find non-segregating variants (where at most one allele is
@@ -2848,9 +3027,9 @@ class AlleleCountsArray(NumpyArrayWrapper, DisplayAs2D):
         """
 
         if allele is None:
-            return self.allelism() <= 1
+            return self._allelism() <= 1
         else:
-            return (self.allelism() == 1) & (self.values[:, allele] > 0)
+            return (self._allelism() == 1) & (self.values[:, allele] > 0)
 
     def is_singleton(self, allele):
         """Find variants with a single call for the given allele.
@@ -2926,7 +3105,7 @@ class AlleleCountsArray(NumpyArrayWrapper, DisplayAs2D):
             condition.
 
         """
-        return self.allelism() == 2
+        return self._allelism() == 2
 
     def is_biallelic_01(self, min_mac=None):
         """Find variants biallelic for the reference (0) and first alternate
@@ -2951,22 +3130,22 @@ class AlleleCountsArray(NumpyArrayWrapper, DisplayAs2D):
         return loc
 
     def count_variant(self):
-        return np.sum(self.is_variant())
+        return np.count_nonzero(self.is_variant())
 
     def count_non_variant(self):
-        return np.sum(self.is_non_variant())
+        return np.count_nonzero(self.is_non_variant())
 
     def count_segregating(self):
-        return np.sum(self.is_segregating())
+        return np.count_nonzero(self.is_segregating())
 
     def count_non_segregating(self, allele=None):
-        return np.sum(self.is_non_segregating(allele=allele))
+        return np.count_nonzero(self.is_non_segregating(allele=allele))
 
     def count_singleton(self, allele=1):
-        return np.sum(self.is_singleton(allele=allele))
+        return np.count_nonzero(self.is_singleton(allele=allele))
 
     def count_doubleton(self, allele=1):
-        return np.sum(self.is_doubleton(allele=allele))
+        return np.count_nonzero(self.is_doubleton(allele=allele))
 
     def map_alleles(self, mapping, max_allele=None):
         """Transform alleles via a mapping.
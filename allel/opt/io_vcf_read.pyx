@@ -23,7 +23,7 @@ from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
 # noinspection PyUnresolvedReferences
 from libc.stdlib cimport strtol, strtof, strtod, malloc, free, realloc
 # noinspection PyUnresolvedReferences
-from libc.string cimport strcmp, memcpy
+from libc.string cimport strcmp, memcmp, memcpy, memchr
 import numpy as np
 cimport numpy as np
 from cpython.ref cimport PyObject
@@ -213,6 +213,31 @@ cdef class InputStreamBase:
         """Read the next character from the stream and store it in the `c` attribute."""
         pass
 
+    cdef int advance_to_eol(self) except -1:  # nogil
+        """Advance the stream until the current character is LF, CR or end of file."""
+        while self.c != 0 and self.c != LF and self.c != CR:
+            self.advance()
+
+    cdef int advance_to_delim(self, char delim) except -1:  # nogil
+        """Advance the stream until the current character is `delim`, TAB, LF, CR or
+        end of file."""
+        while (self.c != 0 and self.c != delim and self.c != TAB and self.c != LF and
+               self.c != CR):
+            self.advance()
+
+    cdef Py_ssize_t advance_to_tab(self, Py_ssize_t n) except -1:  # nogil
+        """Advance the stream until the current character is the `n`th TAB (counting
+        the current character), LF, CR or end of file. Return the number of TABs
+        passed over."""
+        cdef Py_ssize_t n_passed = 0
+        while self.c != 0 and self.c != LF and self.c != CR:
+            if self.c == TAB:
+                if n_passed + 1 >= n:
+                    break
+                n_passed += 1
+            self.advance()
+        return n_passed
+
 
 cdef class FileInputStream(InputStreamBase):
 
@@ -264,6 +289,78 @@ cdef class FileInputStream(InputStreamBase):
             self.c = self.stream[0]
             self.stream += 1
 
+    cdef int advance_to_eol(self) except -1:  # nogil
+        """Advance the stream until the current character is LF, CR or end of file,
+        searching the buffer with memchr rather than one character at a time."""
+        cdef:
+            char* eol
+            char* cr
+        while self.c != 0 and self.c != LF and self.c != CR:
+            eol = <char*> memchr(self.stream, LF, self.buffer_end - self.stream)
+            if eol is NULL:
+                eol = self.buffer_end
+            # N.B., CR also terminates a line, but is rare, so search for it separately
+            # and only up to the next LF
+            cr = <char*> memchr(self.stream, CR, eol - self.stream)
+            if cr is not NULL:
+                eol = cr
+            if eol < self.buffer_end:
+                self.c = eol[0]
+                self.stream = eol + 1
+            else:
+                # end of buffer, read more
+                self.stream = self.buffer_end
+                self.advance()
+
+    cdef int advance_to_delim(self, char delim) except -1:  # nogil
+        """Advance the stream until the current character is `delim`, TAB, LF, CR or
+        end of file, scanning the buffer directly rather than calling advance() for
+        each character."""
+        cdef:
+            char* p
+        while (self.c != 0 and self.c != delim and self.c != TAB and self.c != LF and
+               self.c != CR):
+            p = self.stream
+            while (p < self.buffer_end and p[0] != delim and p[0] != TAB and p[0] != LF and
+                   p[0] != CR):
+                p += 1
+            if p < self.buffer_end:
+                self.c = p[0]
+                self.stream = p + 1
+            else:
+                # end of buffer, read more
+                self.stream = self.buffer_end
+                self.advance()
+
+    cdef Py_ssize_t advance_to_tab(self, Py_ssize_t n) except -1:  # nogil
+        """Advance the stream until the current character is the `n`th TAB (counting
+        the current character), LF, CR or end of file, scanning the buffer directly.
+        Return the number of TABs passed over."""
+        cdef:
+            Py_ssize_t n_passed = 0
+            char* p
+        while self.c != 0 and self.c != LF and self.c != CR:
+            if self.c == TAB:
+                if n_passed + 1 >= n:
+                    break
+                n_passed += 1
+            p = self.stream
+            while p < self.buffer_end and p[0] != LF and p[0] != CR:
+                if p[0] == TAB:
+                    if n_passed + 1 >= n:
+                        break
+                    n_passed += 1
+                p += 1
+            if p < self.buffer_end:
+                self.c = p[0]
+                self.stream = p + 1
+                break
+            else:
+                # end of buffer, read more
+                self.stream = self.buffer_end
+                self.advance()
+        return n_passed
+
     cdef int read_line_into(self, CharVector* dest) except -1:  # nogil
         """Read up to end of line or end of file (whichever comes first) and append
         chars to the `dest` buffer."""
@@ -315,6 +412,22 @@ cdef class FileInputStream(InputStreamBase):
         CharVector_free(&line)
         return ret
 
+    def read_headers(self):
+        """Read consecutive lines beginning with "#", stopping after the line beginning
+        "#CHROM", and return as a single Python bytes object."""
+        cdef CharVector lines
+        cdef Py_ssize_t start
+        CharVector_init(&lines, 2**16)
+        while self.c == HASH:
+            start = lines.size
+            self.read_line_into(&lines)
+            if (lines.size - start >= 6 and
+                    memcmp(lines.data + start, b'#CHROM', 6) == 0):
+                break
+        ret = CharVector_to_pybytes(&lines)
+        CharVector_free(&lines)
+        return ret
+
 
 cdef class CharVectorInputStream(InputStreamBase):
 
@@ -888,23 +1001,17 @@ cdef class VCFSkipFieldParser(VCFFieldParserBase):
 
     cdef int parse(self, InputStreamBase stream, VCFContext context) except -1:  # nogil
 
-        while True:
-
-            if stream.c == 0:
-                context.state = VCFState.EOF
-                break
+        stream.advance_to_delim(TAB)
 
-            elif stream.c == LF or stream.c == CR:
-                context.state = VCFState.EOL
-                break
+        if stream.c == 0:
+            context.state = VCFState.EOF
 
-            elif stream.c == TAB:
-                stream.advance()
-                context.state += 1
-                break
+        elif stream.c == LF or stream.c == CR:
+            context.state = VCFState.EOL
 
-            # advance input stream
+        else:
             stream.advance()
+            context.state += 1
 
     cdef int malloc_chunk(self) except -1:
         pass
@@ -974,15 +1081,11 @@ cdef int vcf_parse_missing(InputStreamBase stream,
 
 cdef int vcf_skip_variant(InputStreamBase stream, VCFContext context) except -1:  # nogil
     # skip to EOL or EOF
-    while True:
-        if stream.c == 0:
-            context.state = VCFState.EOF
-            break
-        elif stream.c == LF or stream.c == CR:
-            context.state = VCFState.EOL
-            break
-        # advance input stream
-        stream.advance()
+    stream.advance_to_eol()
+    if stream.c == 0:
+        context.state = VCFState.EOF
+    else:
+        context.state = VCFState.EOL
 
 
 cdef class VCFChromPosParser(VCFFieldParserBase):
@@ -2166,12 +2269,7 @@ cdef class VCFInfoFlagParser(VCFInfoParserBase):
         # nothing to parse
         self.memory[context.chunk_variant_index] = 1
         # ensure we advance the end of the field
-        while stream.c != SEMICOLON and \
-                stream.c != TAB and \
-                stream.c != LF and \
-                stream.c != CR and \
-                stream.c != 0:
-            stream.advance()
+        stream.advance_to_delim(SEMICOLON)
 
     cdef int make_chunk(self, chunk, limit=None) except -1:
         # override to view as bool array
@@ -2291,12 +2389,7 @@ cdef class VCFInfoSkipParser(VCFInfoParserBase):
 
     cdef int parse(self, InputStreamBase stream, VCFContext context) except -1:  # nogil
         # ensure we advance the end of the field
-        while stream.c != SEMICOLON and \
-                stream.c != TAB and \
-                stream.c != LF and \
-                stream.c != CR and \
-                stream.c != 0:
-            stream.advance()
+        stream.advance_to_delim(SEMICOLON)
 
     cdef int malloc_chunk(self) except -1:
         pass
@@ -2511,6 +2604,7 @@ cdef class VCFCallDataParser(VCFFieldParserBase):
         PyObject** parsers_cptr
         VCFCallDataParserBase skip_parser
         np.uint8_t[:] loc_samples
+        Py_ssize_t[:] skip_samples
         Py_ssize_t n_samples
         Py_ssize_t n_samples_out
 
@@ -2520,6 +2614,14 @@ cdef class VCFCallDataParser(VCFFieldParserBase):
         self.n_samples = loc_samples.shape[0]
         self.n_samples_out = np.count_nonzero(loc_samples)
 
+        # for each sample, the number of consecutive samples from there on that are not
+        # selected, so runs of unselected samples can be skipped in one go
+        skip_samples = np.zeros(self.n_samples, dtype=np.intp)
+        for i in range(self.n_samples - 1, -1, -1):
+            if not loc_samples[i]:
+                skip_samples[i] = 1 + (skip_samples[i + 1] if i + 1 < self.n_samples else 0)
+        self.skip_samples = skip_samples
+
         # setup formats
         self.format_keys = tuple(sorted(format_keys))
         self.n_formats = len(self.format_keys)
@@ -2655,9 +2757,8 @@ cdef class VCFCallDataParser(VCFFieldParserBase):
         if self.loc_samples[0]:
             context.sample_output_index += 1
         else:
-            # skip to next sample
-            while stream.c != 0 and stream.c != LF and stream.c != CR and stream.c != TAB:
-                stream.advance()
+            # skip to next selected sample
+            context.sample_index += stream.advance_to_tab(self.skip_samples[0])
 
         while True:
 
@@ -2679,12 +2780,15 @@ cdef class VCFCallDataParser(VCFFieldParserBase):
                 stream.advance()
                 context.sample_index += 1
                 context.sample_field_index = 0
-                if self.loc_samples[context.sample_index]:
+                if context.sample_index >= self.n_samples:
+                    # more samples than given in header, handled above
+                    stream.advance_to_delim(TAB)
+                elif self.loc_samples[context.sample_index]:
                     context.sample_output_index += 1
                 else:
-                    # skip to next sample
-                    while stream.c != 0 and stream.c != LF and stream.c != CR and stream.c != TAB:
-                        stream.advance()
+                    # skip to next selected sample
+                    context.sample_index += stream.advance_to_tab(
+                        self.skip_samples[context.sample_index])
 
             elif stream.c == COLON:
                 context.sample_field_index += 1
@@ -2765,12 +2869,7 @@ cdef class VCFCallDataSkipParser(VCFCallDataParserBase):
         super(VCFCallDataSkipParser, self).__init__(key=key)
 
     cdef int parse(self, InputStreamBase stream, VCFContext context) except -1:  # nogil
-        while stream.c != COLON and \
-                stream.c != TAB and \
-                stream.c != CR and \
-                stream.c != LF and \
-                stream.c != 0:
-            stream.advance()
+        stream.advance_to_delim(COLON)
 
     cdef int make_chunk(self, chunk, limit=None) except -1:
         pass
@@ -3717,7 +3816,11 @@ cdef int warn(message, VCFContext context) except -1:
             format = 'unknown'
         else:
             format_index = context.variant_format_indices.data[context.sample_field_index]
-            format = context.formats[format_index]
+            if format_index < 0:
+                # format not requested
+                format = 'unknown'
+            else:
+                format = context.formats[format_index]
         message += '; sample: %s:%s (%s:%s)' % (context.sample_index,
                                                 context.sample_field_index,
                                                 sample,
@@ -25,97 +25,134 @@ ctypedef fused integer:
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def genotype_array_pack_diploid(integer[:, :, :] g not None):
+def genotype_array_pack_diploid(integer[:, :, ::1] g not None, bint boundscheck=False):
 
     cdef:
         # counting variables
         Py_ssize_t i, j, n_variants, n_samples
-        # first and second alleles from genotype
-        integer a1, a2
-        # packed genotype
-        cnp.uint8_t p
+        # allele, and min and max alleles seen within a row, for bounds checking
+        integer a, rmn, rmx
+        # min and max alleles seen overall
+        cnp.int64_t amn, amx
+        # pointers to the current rows of input and output arrays
+        integer* row
+        cnp.uint8_t* prow
         # create output array
-        cnp.uint8_t[:, :] packed
+        cnp.uint8_t[:, ::1] packed
 
     # setup
     n_variants = g.shape[0]
     n_samples = g.shape[1]
     packed = np.empty((n_variants, n_samples), dtype='u1')
+    amn = 0
+    amx = 0
+    if n_samples == 0:
+        return np.asarray(packed)
 
     # main work loop
     with nogil:
         for i in range(n_variants):
-            for j in range(n_samples):
-                a1 = g[i, j, 0]
-                a2 = g[i, j, 1]
-
-                # add 1 to handle missing alleles coded as -1
-                a1 += 1
-                a2 += 1
-
-                # left shift first allele by 4 bits
-                a1 <<= 4
-
-                # mask left-most 4 bits to ensure second allele doesn't clash with
-                # first allele
-                a2 &= 15
+            row = &g[i, 0, 0]
+            prow = &packed[i, 0]
 
-                # pack the alleles into a single byte
-                p = a1 | a2
-
-                # rotate round so that hom ref calls are encoded as 0, better for
-                # sparse matrices
-                p -= 17
-
-                # assign to output array
-                packed[i, j] = p
+            # keep the packing loop free of branches over contiguous memory, so
+            # the compiler is able to vectorise it
+            for j in range(n_samples):
+                # add 1 to handle missing alleles coded as -1, left shift first
+                # allele by 4 bits, mask left-most 4 bits to ensure second allele
+                # doesn't clash with first allele, then pack the alleles into a
+                # single byte, rotating round so that hom ref calls are encoded as
+                # 0, better for sparse matrices
+                prow[j] = <cnp.uint8_t> ((((row[2*j] + 1) << 4) | ((row[2*j+1] + 1) & 15)) - 17)
+
+            # track allele range in a separate pass over the row while it is still
+            # in cache, to avoid separate passes over the whole array
+            if boundscheck:
+                rmn = rmx = row[0]
+                for j in range(2 * n_samples):
+                    a = row[j]
+                    rmx = a if a > rmx else rmx
+                    rmn = a if a < rmn else rmn
+                amx = max(amx, <cnp.int64_t> rmx)
+                amn = min(amn, <cnp.int64_t> rmn)
+
+    if boundscheck:
+        if amx > 14:
+            raise ValueError('max allele for packing is 14, found %s' % amx)
+        if amn < -1:
+            raise ValueError('min allele for packing is -1, found %s' % amn)
 
     return np.asarray(packed)
 
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def genotype_array_unpack_diploid(cnp.uint8_t[:, :] packed not None):
+def genotype_array_unpack_diploid(cnp.uint8_t[:, ::1] packed not None):
 
     cdef:
         # counting variables
         Py_ssize_t i, j, n_variants, n_samples
-        # first and second alleles
-        cnp.int8_t a1, a2
         # packed genotype
         cnp.uint8_t p
+        # pointers to the current rows of input and output arrays
+        cnp.uint8_t* prow
+        cnp.int8_t* row
         # output
-        cnp.int8_t[:, :, :] g
+        cnp.int8_t[:, :, ::1] g
 
     # setup
     n_variants = packed.shape[0]
     n_samples = packed.shape[1]
     g = np.empty((n_variants, n_samples, 2), dtype='i1')
+    if n_samples == 0:
+        return np.asarray(g)
 
     # main work loop
     with nogil:
         for i in range(n_variants):
-            for j in range(n_samples):
-                p = packed[i, j]
+            prow = &packed[i, 0]
+            row = &g[i, 0, 0]
 
+            # keep the loop free of branches over contiguous memory, so the
+            # compiler is able to vectorise it
+            for j in range(n_samples):
                 # rotate back round so missing calls are encoded as 0
-                p += 17
+                p = prow[j] + 17
 
-                # right shift 4 bits to extract first allele
-                a1 = p >> 4
+                # right shift 4 bits to extract first allele, mask left-most 4
+                # bits to extract second allele, then subtract 1 to restore
+                # coding of missing alleles as -1
+                row[2*j] = <cnp.int8_t> (p >> 4) - 1
+                row[2*j+1] = <cnp.int8_t> (p & 15) - 1
 
-                # mask left-most 4 bits to extract second allele
-                a2 = p & 15
+    return np.asarray(g)
 
-                # subtract 1 to restore coding of missing alleles as -1
-                a1 -= 1
-                a2 -= 1
 
-                # assign to output array
-                g[i, j, 0] = a1
-                g[i, j, 1] = a2
+# above this many alleles, counting each allele in a separate pass over a row
+# costs more than a single pass incrementing a counter per allele call
+cdef enum:
+    COUNT_ALLELES_MAX_PASSES = 8
 
-    return np.asarray(g)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void count_alleles_row(integer* row,
+                                   Py_ssize_t n,
+                                   integer max_allele,
+                                   cnp.int32_t[:] out) nogil:
+    # count each allele in a separate branch-free pass over a contiguous row,
+    # which the compiler can vectorise, unlike incrementing a counter indexed
+    # by each allele call
+    cdef:
+        Py_ssize_t j
+        integer allele
+        cnp.int32_t count
+
+    for allele in range(max_allele + 1):
+        count = 0
+        for j in range(n):
+            count += row[j] == allele
+        out[allele] = count
 
 
 @cython.boundscheck(False)
@@ -132,13 +169,18 @@ def haplotype_array_count_alleles(integer[:, :] h not None, integer max_allele):
 
     # main work loop
     with nogil:
-        # iterate over variants
-        for i in range(n_variants):
-            # iterate over haplotypes
-            for j in range(n_haplotypes):
-                allele = h[i, j]
-                if 0 <= allele <= max_allele:
-                    ac[i, allele] += 1
+        if n_haplotypes > 0 and h.strides[1] == sizeof(integer) and \
+                max_allele < COUNT_ALLELES_MAX_PASSES:
+            for i in range(n_variants):
+                count_alleles_row(&h[i, 0], n_haplotypes, max_allele, ac[i])
+        else:
+            # iterate over variants
+            for i in range(n_variants):
+                # iterate over haplotypes
+                for j in range(n_haplotypes):
+                    allele = h[i, j]
+                    if 0 <= allele <= max_allele:
+                        ac[i, allele] += 1
 
     return np.asarray(ac)
 
@@ -173,6 +215,38 @@ def haplotype_array_count_alleles_subpop(integer[:, :] h not None,
     return np.asarray(ac)
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def haplotype_array_count_alleles_subpops(integer[:, :] h not None,
+                                          integer max_allele,
+                                          cnp.int64_t[:] offsets not None,
+                                          cnp.int64_t[:] members not None,
+                                          Py_ssize_t n_subpops):
+    cdef:
+        cnp.int32_t[:, :, :] ac
+        integer allele
+        Py_ssize_t i, j, m, n_variants, n_haplotypes
+
+    # setup
+    n_variants = h.shape[0]
+    n_haplotypes = h.shape[1]
+    ac = np.zeros((n_subpops, n_variants, max_allele + 1), dtype='i4')
+
+    # main work loop, reading the data once for all subpopulations
+    with nogil:
+        # iterate over variants
+        for i in range(n_variants):
+            # iterate over haplotypes
+            for j in range(n_haplotypes):
+                allele = h[i, j]
+                if 0 <= allele <= max_allele:
+                    # iterate over subpopulations this haplotype belongs to
+                    for m in range(offsets[j], offsets[j + 1]):
+                        ac[members[m], i, allele] += 1
+
+    return np.asarray(ac)
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def genotype_array_count_alleles(integer[:, :, :] g not None,
@@ -190,15 +264,21 @@ def genotype_array_count_alleles(integer[:, :, :] g not None,
 
     # main work loop
     with nogil:
-        # iterate over variants
-        for i in range(n_variants):
-            # iterate over samples
-            for j in range(n_samples):
-                # iterate over alleles
-                for k in range(ploidy):
-                    allele = g[i, j, k]
-                    if 0 <= allele <= max_allele:
-                        ac[i, allele] += 1
+        if n_samples > 0 and ploidy > 0 and g.strides[2] == sizeof(integer) and \
+                g.strides[1] == ploidy * sizeof(integer) and \
+                max_allele < COUNT_ALLELES_MAX_PASSES:
+            for i in range(n_variants):
+                count_alleles_row(&g[i, 0, 0], n_samples * ploidy, max_allele, ac[i])
+        else:
+            # iterate over variants
+            for i in range(n_variants):
+                # iterate over samples
+                for j in range(n_samples):
+                    # iterate over alleles
+                    for k in range(ploidy):
+                        allele = g[i, j, k]
+                        if 0 <= allele <= max_allele:
+                            ac[i, allele] += 1
 
     return np.asarray(ac)
 
@@ -303,6 +383,364 @@ def genotype_array_count_alleles_subpop_masked(integer[:, :, :] g not None,
     return np.asarray(ac)
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def genotype_array_count_alleles_subpops(integer[:, :, :] g not None,
+                                         integer max_allele,
+                                         cnp.int64_t[:] offsets not None,
+                                         cnp.int64_t[:] members not None,
+                                         Py_ssize_t n_subpops):
+    cdef:
+        cnp.int32_t[:, :, :] ac
+        integer allele
+        Py_ssize_t i, j, k, m, n_variants, n_samples, ploidy
+
+    # setup
+    n_variants = g.shape[0]
+    n_samples = g.shape[1]
+    ploidy = g.shape[2]
+    ac = np.zeros((n_subpops, n_variants, max_allele + 1), dtype='i4')
+
+    # main work loop, reading the data once for all subpopulations
+    with nogil:
+        # iterate over variants
+        for i in range(n_variants):
+            # iterate over samples
+            for j in range(n_samples):
+                # skip samples not in any subpopulation
+                if offsets[j] == offsets[j + 1]:
+                    continue
+                # iterate over alleles
+                for k in range(ploidy):
+                    allele = g[i, j, k]
+                    if 0 <= allele <= max_allele:
+                        # iterate over subpopulations this sample belongs to
+                        for m in range(offsets[j], offsets[j + 1]):
+                            ac[members[m], i, allele] += 1
+
+    return np.asarray(ac)
+
+
+# genotype call conditions supported by genotype_array_match() and
+# genotype_array_count()
+cpdef enum:
+    GT_CALLED = 0
+    GT_MISSING = 1
+    GT_HOM = 2
+    GT_HOM_ALLELE = 3
+    GT_HOM_ALT = 4
+    GT_HET = 5
+    GT_HET_ALLELE = 6
+    GT_CALL = 7
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline bint diploid_call_matches(integer a0,
+                                      integer a1,
+                                      int condition,
+                                      cnp.int64_t allele,
+                                      cnp.int64_t[:] call) nogil:
+    # loop-free specialisation of genotype_call_matches() for diploid calls;
+    # comparisons are combined with bitwise rather than short-circuiting
+    # operators, so there are no data-dependent branches to mispredict
+
+    if condition == GT_CALLED:
+        return (a0 >= 0) & (a1 >= 0)
+
+    elif condition == GT_MISSING:
+        return (a0 < 0) | (a1 < 0)
+
+    elif condition == GT_HOM:
+        return (a0 >= 0) & (a0 == a1)
+
+    elif condition == GT_HOM_ALT:
+        return (a0 > 0) & (a0 == a1)
+
+    elif condition == GT_HOM_ALLELE:
+        return (a0 == allele) & (a1 == allele)
+
+    elif condition == GT_HET:
+        return (a0 >= 0) & (a1 >= 0) & (a0 != a1)
+
+    elif condition == GT_HET_ALLELE:
+        return (a0 >= 0) & (a1 >= 0) & (a0 != a1) & ((a0 == allele) | (a1 == allele))
+
+    elif condition == GT_CALL:
+        return (a0 == call[0]) & (a1 == call[1])
+
+    return False
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline bint genotype_call_matches(integer[:, :, :] g,
+                                       Py_ssize_t i,
+                                       Py_ssize_t j,
+                                       int condition,
+                                       cnp.int64_t allele,
+                                       cnp.int64_t[:] call) nogil:
+    cdef:
+        Py_ssize_t k, ploidy
+        integer a0, a
+        bint het, any_allele
+
+    ploidy = g.shape[2]
+    a0 = g[i, j, 0]
+
+    if ploidy == 2:
+        return diploid_call_matches(a0, g[i, j, 1], condition, allele, call)
+
+    if condition == GT_CALLED:
+        for k in range(ploidy):
+            if g[i, j, k] < 0:
+                return False
+        return True
+
+    elif condition == GT_MISSING:
+        for k in range(ploidy):
+            if g[i, j, k] < 0:
+                return True
+        return False
+
+    elif condition == GT_HOM or condition == GT_HOM_ALT:
+        if a0 < 0 or (condition == GT_HOM_ALT and a0 == 0):
+            return False
+        for k in range(1, ploidy):
+            if g[i, j, k] != a0:
+                return False
+        return True
+
+    elif condition == GT_HOM_ALLELE:
+        for k in range(ploidy):
+            if g[i, j, k] != allele:
+                return False
+        return True
+
+    elif condition == GT_HET or condition == GT_HET_ALLELE:
+        if a0 < 0:
+            return False
+        any_allele = a0 == allele
+        het = False
+        for k in range(1, ploidy):
+            a = g[i, j, k]
+            if a < 0:
+                return False
+            if a != a0:
+                het = True
+            if a == allele:
+                any_allele = True
+        if condition == GT_HET_ALLELE:
+            return het and any_allele
+        return het
+
+    elif condition == GT_CALL:
+        for k in range(ploidy):
+            if g[i, j, k] != call[k]:
+                return False
+        return True
+
+    return False
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def genotype_array_match(integer[:, :, :] g not None,
+                         int condition,
+                         cnp.int64_t allele=0,
+                         cnp.int64_t[:] call=None):
+    """Find genotype calls matching `condition` in a single pass, without
+    materialising any intermediate arrays."""
+    cdef:
+        Py_ssize_t i, j, n_variants, n_samples
+        cnp.int64_t c0, c1
+        cnp.uint8_t[:, :] out
+
+    # setup
+    n_variants = g.shape[0]
+    n_samples = g.shape[1]
+    if condition == GT_CALL and (call is None or call.shape[0] != g.shape[2]):
+        raise ValueError('invalid call ploidy: %r' % call)
+    out = np.empty((n_variants, n_samples), dtype='u1')
+
+    # main work loop
+    with nogil:
+        if condition == GT_CALL and g.shape[2] == 2:
+            # load the call once, rather than for every genotype
+            c0 = call[0]
+            c1 = call[1]
+            for i in range(n_variants):
+                for j in range(n_samples):
+                    out[i, j] = (g[i, j, 0] == c0) & (g[i, j, 1] == c1)
+        else:
+            for i in range(n_variants):
+                for j in range(n_samples):
+                    out[i, j] = genotype_call_matches(g, i, j, condition, allele, call)
+
+    return np.asarray(out).view(bool)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def genotype_array_count(integer[:, :, :] g not None,
+                         int condition,
+                         int axis,
+                         cnp.int64_t allele=0,
+                         cnp.int64_t[:] call=None,
+                         cnp.uint8_t[:, :] mask=None):
+    """Count genotype calls matching `condition` in a single pass, without
+    materialising an intermediate boolean array. If `axis` is 0, counts are
+    returned per sample, otherwise counts are returned per variant. Calls
+    where `mask` is true are treated as missing."""
+    cdef:
+        Py_ssize_t i, j, n_variants, n_samples
+        cnp.int64_t[:] out
+        cnp.int64_t n, c0, c1
+        bint masked, match
+
+    # setup
+    n_variants = g.shape[0]
+    n_samples = g.shape[1]
+    if condition == GT_CALL and (call is None or call.shape[0] != g.shape[2]):
+        raise ValueError('invalid call ploidy: %r' % call)
+    masked = mask is not None
+    if masked and (mask.shape[0] != n_variants or mask.shape[1] != n_samples):
+        raise ValueError('mask has incorrect shape')
+    if axis == 0:
+        out = np.zeros(n_samples, dtype='i8')
+    else:
+        out = np.zeros(n_variants, dtype='i8')
+
+    # main work loop
+    with nogil:
+        if condition == GT_CALL and g.shape[2] == 2 and not masked:
+            # load the call once, rather than for every genotype
+            c0 = call[0]
+            c1 = call[1]
+            for i in range(n_variants):
+                n = 0
+                for j in range(n_samples):
+                    match = (g[i, j, 0] == c0) & (g[i, j, 1] == c1)
+                    if axis == 0:
+                        out[j] += match
+                    else:
+                        n += match
+                if axis != 0:
+                    out[i] = n
+
+        else:
+            for i in range(n_variants):
+                n = 0
+                for j in range(n_samples):
+                    if masked and mask[i, j]:
+                        match = condition == GT_MISSING
+                    else:
+                        match = genotype_call_matches(g, i, j, condition, allele, call)
+                    # accumulate without branching on the match
+                    if axis == 0:
+                        out[j] += match
+                    else:
+                        n += match
+                if axis != 0:
+                    out[i] = n
+
+    return np.asarray(out)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def genotype_array_to_n_allele(integer[:, :, :] g not None,
+                               bint alt,
+                               cnp.int8_t fill=0,
+                               cnp.uint8_t[:, :] mask=None):
+    """Count reference alleles, or if `alt` is true non-reference alleles, in
+    each genotype call in a single pass. Calls where `mask` is true are set to
+    `fill`, as are missing calls if `fill` is non-zero."""
+    cdef:
+        Py_ssize_t i, j, k, n_variants, n_samples, ploidy
+        integer a, b
+        cnp.int8_t n
+        bint masked, missing, fill_missing, fill_call
+        cnp.int8_t[:, :] out
+
+    # setup
+    n_variants = g.shape[0]
+    n_samples = g.shape[1]
+    ploidy = g.shape[2]
+    masked = mask is not None
+    if masked and (mask.shape[0] != n_variants or mask.shape[1] != n_samples):
+        raise ValueError('mask has incorrect shape')
+    out = np.empty((n_variants, n_samples), dtype='i1')
+    fill_missing = fill != 0
+
+    # main work loop
+    with nogil:
+        for i in range(n_variants):
+            for j in range(n_samples):
+                if ploidy == 2:
+                    # branch-free specialisation for diploid calls
+                    a = g[i, j, 0]
+                    b = g[i, j, 1]
+                    missing = (a < 0) | (b < 0)
+                    if alt:
+                        n = (a > 0) + (b > 0)
+                    else:
+                        n = (a == 0) + (b == 0)
+                else:
+                    n = 0
+                    missing = False
+                    for k in range(ploidy):
+                        a = g[i, j, k]
+                        if a < 0:
+                            missing = True
+                        elif alt:
+                            n += a > 0
+                        else:
+                            n += a == 0
+                fill_call = missing & fill_missing
+                if masked:
+                    fill_call |= mask[i, j] != 0
+                out[i, j] = n + fill_call * (fill - n)
+
+    return np.asarray(out)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def genotype_array_to_allele_counts(integer[:, :, :] g not None,
+                                    integer max_allele,
+                                    cnp.uint8_t[:, :] mask=None):
+    """Count each allele up to `max_allele` in each genotype call in a single
+    pass. Calls where `mask` is true are not counted."""
+    cdef:
+        Py_ssize_t i, j, k, n_variants, n_samples, ploidy
+        integer allele
+        bint masked
+        cnp.uint8_t[:, :, :] out
+
+    # setup
+    n_variants = g.shape[0]
+    n_samples = g.shape[1]
+    ploidy = g.shape[2]
+    masked = mask is not None
+    if masked and (mask.shape[0] != n_variants or mask.shape[1] != n_samples):
+        raise ValueError('mask has incorrect shape')
+    out = np.zeros((n_variants, n_samples, max_allele + 1), dtype='u1')
+
+    # main work loop
+    with nogil:
+        for i in range(n_variants):
+            for j in range(n_samples):
+                if masked and mask[i, j]:
+                    continue
+                for k in range(ploidy):
+                    allele = g[i, j, k]
+                    if 0 <= allele <= max_allele:
+                        out[i, j, allele] += 1
+
+    return np.asarray(out)
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def haplotype_array_map_alleles(integer[:, :] h not None,
@@ -19,6 +19,7 @@ from pytest import approx
 from allel.io.vcf_read import (iter_vcf_chunks, read_vcf, vcf_to_zarr, vcf_to_hdf5,
                                vcf_to_npz, ANNTransformer, vcf_to_dataframe, vcf_to_csv,
                                vcf_to_recarray, read_vcf_headers)
+from allel.io import vcf_read
 from allel.compat import PY2
 from allel.test.tools import compare_arrays
 
@@ -146,6 +147,17 @@ def test_fields_all():
     assert sorted(expected_fields) == sorted(callset.keys())
 
 
+def test_fields_overlapping():
+    vcf_path = fixture_path('sample.vcf')
+    fields = ['FILTER_q10', 'DP', 'calldata/GT', 'FILTER', 'INFO', '*', 'AA']
+    fields, _, _, _ = iter_vcf_chunks(vcf_path, fields=fields)
+    # each field once, in order of first mention
+    assert ['variants/FILTER_q10', 'variants/DP', 'calldata/GT'] == fields[:3]
+    assert len(set(fields)) == len(fields)
+    callset = read_vcf(vcf_path, fields='*')
+    assert sorted(callset.keys()) == sorted(['samples'] + fields)
+
+
 def test_fields_exclude():
     vcf_path = fixture_path('sample.vcf')
     exclude = ['variants/altlen', 'ID', 'calldata/DP']
@@ -1337,6 +1349,51 @@ def test_read_region():
             assert_array_equal([1234567, 1235237], pos)
 
 
+def test_read_region_bad_index():
+    # Test fall-back to scanning when the tabix index cannot be read.
+
+    fn = os.path.join(tempdir, 'sample.vcf.gz')
+    shutil.copy(fixture_path('sample.vcf.gz'), fn)
+    with open(fn + '.tbi', mode='wb') as f:
+        f.write(b'foo')
+
+    with pytest.warns(UserWarning):
+        callset = read_vcf(fn, region='20:1000000-1233000')
+    assert_array_equal([1110696, 1230237], callset['variants/POS'])
+
+
+def test_read_region_multiblock():
+    # Test reading regions via tabix and CSI indexes, from a file compressed in many
+    # small BGZF blocks so that records cross block boundaries, and where some
+    # records are stored in higher-level bins.
+
+    fn = fixture_path('multiblock.vcf.gz')
+    fn_csi = os.path.join(tempdir, 'multiblock.vcf.gz')
+    shutil.copy(fn, fn_csi)
+    shutil.copy(fn + '.csi', fn_csi + '.csi')
+    fields = ['variants/CHROM', 'variants/POS', 'variants/REF', 'calldata/GT']
+
+    regions = ['chr1', 'chr2', 'chr3', 'chr1:16370-16400', 'chr1:16390-16390',
+               'chr1:1-500000', 'chr1:100000-250000', 'chr1:262150-262160',
+               'chr2:1000-20000', 'chr2:120000-140000']
+    for region in regions:
+        expect = read_vcf(fn, region=region, tabix=None, fields=fields)
+        for path in fn, fn_csi:
+            with warnings.catch_warnings():
+                # should not fall back to scanning
+                warnings.simplefilter('error')
+                actual = read_vcf(path, region=region, tabix='tabix', fields=fields)
+            if expect is None:
+                assert actual is None
+            else:
+                assert sorted(expect.keys()) == sorted(actual.keys())
+                for k in fields:
+                    assert_array_equal(expect[k], actual[k])
+
+    callset = read_vcf(fn_csi, region='chr1:16370-16400', tabix='tabix', fields=fields)
+    assert_array_equal([16380], callset['variants/POS'])
+
+
 def test_read_region_unsorted():
     # Test behaviour when data are not sorted by chromosome or position and tabix is
     # not available.
@@ -1431,6 +1488,23 @@ def test_read_samples():
         assert (2, 1) == tuple(gt[4, 0])
 
 
+def test_read_samples_skip():
+    # runs of unselected samples are skipped, including across buffer boundaries
+    input_data = (
+        b"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS0\tS1\tS2\tS3\tS4\tS5\n"
+        b"2L\t12\t.\tA\tT\t.\t.\t.\tGQ\t10\t11\t12\t13\t14\t15\n"
+        b"2L\t34\t.\tA\tT\t.\t.\t.\tGQ\t20\t21\t22\t23\t24\t25\n"
+    )
+    for samples in ['S0'], ['S5'], ['S0', 'S5'], ['S1', 'S4'], ['S2', 'S3']:
+        idx = [int(s[1]) for s in samples]
+        for buffer_size in 2, 7, 2**14:
+            callset = read_vcf(io.BytesIO(input_data), fields=['calldata/GQ'],
+                               types={'calldata/GQ': 'i4'}, samples=samples,
+                               buffer_size=buffer_size)
+            expect = [[10 + i for i in idx], [20 + i for i in idx]]
+            assert_array_equal(expect, callset['calldata/GQ'])
+
+
 def test_read_empty():
     vcf_path = fixture_path('empty.vcf')
     callset = read_vcf(vcf_path)
@@ -1792,6 +1866,10 @@ def test_extra_samples():
     assert (1, 4, 2) == callset['calldata/GT'].shape
     callset = read_vcf(path)
     assert (9, 2, 2) == callset['calldata/GT'].shape
+    # with a subset of samples and formats
+    callset = read_vcf(io.BytesIO(input_data), fields=['calldata/GQ'],
+                       types={'calldata/GQ': 'i4'}, samples=['S1', 'S4'])
+    assert_array_equal([[45, 99]], callset['calldata/GQ'])
 
 
 # noinspection PyTypeChecker
@@ -2077,6 +2155,34 @@ def test_header_overrides_default_vcf_type():
     assert approx(41.) == gq[3, 2]
 
 
+def test_default_types(monkeypatch):
+    vcf_path = fixture_path('sample.vcf')
+    callset = read_vcf(vcf_path, fields=['DP', 'calldata/GQ'])
+    assert np.dtype('i4') == callset['variants/DP'].dtype
+    assert np.dtype('i1') == callset['calldata/GQ'].dtype
+
+    # module defaults are looked up on every call, so can be changed at runtime
+    monkeypatch.setitem(vcf_read.default_types, 'variants/DP', 'i8')
+    monkeypatch.setitem(vcf_read.default_types, 'calldata/GQ', 'i2')
+    callset = read_vcf(vcf_path, fields=['DP', 'calldata/GQ'])
+    assert np.dtype('i8') == callset['variants/DP'].dtype
+    assert np.dtype('i2') == callset['calldata/GQ'].dtype
+
+
+def test_default_dtypes(monkeypatch):
+    vcf_path = fixture_path('sample.vcf')
+    callset = read_vcf(vcf_path, fields=['NS', 'AA'])
+    assert np.dtype('i4') == callset['variants/NS'].dtype
+    assert np.dtype(object) == callset['variants/AA'].dtype
+
+    # dtypes for the VCF Integer and String types can be changed at runtime
+    monkeypatch.setattr(vcf_read, 'default_integer_dtype', 'i2')
+    monkeypatch.setattr(vcf_read, 'default_string_dtype', 'S4')
+    callset = read_vcf(vcf_path, fields=['NS', 'AA'])
+    assert np.dtype('i2') == callset['variants/NS'].dtype
+    assert np.dtype('S4') == callset['variants/AA'].dtype
+
+
 def test_missing_calldata():
     vcf_path = fixture_path('test1.vcf')
     callset = read_vcf(vcf_path, fields='calldata/*', numbers={'AD': 2})
@@ -2804,3 +2910,18 @@ def test_read_vcf_headers():
     assert '2' == headers.formats['HQ']['Number']
     assert 'Integer' == headers.formats['HQ']['Type']
     assert 'Haplotype Quality' == headers.formats['HQ']['Description']
+
+    # raw header lines, up to and including the "#CHROM" line
+    with open(vcf_path, mode='rb') as f:
+        data = f.read()
+    expect = [line + '\n' for line in data.decode().split('\n')
+              if line.startswith('#')]
+    assert expect == headers.headers
+    for d in data.replace(b'\n', b'\r'), data.replace(b'\n', b'\r\n'):
+        assert expect == read_vcf_headers(io.BytesIO(d)).headers
+
+    # header only, last line not terminated
+    d = data[:data.index(b'\n', data.index(b'#CHROM'))]
+    headers = read_vcf_headers(io.BytesIO(d))
+    assert expect[:-1] + [expect[-1][:-1]] == headers.headers
+    assert ['NA00001', 'NA00002', 'NA00003'] == headers.samples
@@ -373,6 +373,12 @@ class GenotypeVectorTests(unittest.TestCase):
         gs = gv[np.newaxis, :2, 0]  # change dimension semantics
         assert not isinstance(gs, GenotypeVector)
 
+    def test_is_hom_haploid(self):
+        gv = GenotypeVector([[0], [1], [-1], [2]])
+        aeq([True, True, False, True], gv.is_hom())
+        aeq([False, True, False, True], gv.is_hom_alt())
+        aeq([True, False, False, False], gv.is_hom_ref())
+
     # __getitem__
     # to_html_str
     # _repr_html_
@@ -478,3 +484,107 @@ class GenotypeAlleleCountsArrayTests(GenotypeAlleleCountsArrayInterface, unittes
         s = g[0, 0, 0]
         assert isinstance(s, np.int8)
         assert not isinstance(s, GenotypeAlleleCountsArray)
+
+
+def _kernel_genotype_data(ploidy, max_allele, layout, masked):
+    # random calls including missing, as an array which is C contiguous, Fortran
+    # contiguous, or a strided view
+    rs = np.random.RandomState(ploidy * 100 + max_allele)
+    data = rs.randint(-1, max_allele + 1, size=(40, 24, ploidy)).astype('i1')
+    # make homozygous calls common
+    hom = rs.rand(40, 24) < 0.5
+    data[hom] = data[hom][:, :1]
+    if layout == 'F':
+        data = np.asfortranarray(data)
+    elif layout == 'strided':
+        data = data[:, ::2]
+    g = GenotypeArray(data, copy=False)
+    if masked:
+        g.mask = rs.rand(*g.shape[:2]) < 0.2
+    return g
+
+
+def _kernel_vectors(g):
+    # one vector per sample, evaluated with the element-wise numpy code
+    vectors = []
+    for j in range(g.shape[1]):
+        v = GenotypeVector(g.values[:, j])
+        if g.mask is not None:
+            v.mask = g.mask[:, j]
+        vectors.append(v)
+    return vectors
+
+
+kernel_params = pytest.mark.parametrize(
+    'ploidy, max_allele, layout, masked',
+    [(ploidy, max_allele, layout, masked)
+     for ploidy in (1, 2, 3)
+     for max_allele in (2, 9)
+     for layout in ('C', 'F', 'strided')
+     for masked in (False, True)]
+)
+
+
+@kernel_params
+def test_genotype_match_kernel(ploidy, max_allele, layout, masked):
+    g = _kernel_genotype_data(ploidy, max_allele, layout, masked)
+    vectors = _kernel_vectors(g)
+    call = (0,) * (ploidy - 1) + (1,)
+    for method, kwargs in (('is_called', {}), ('is_missing', {}), ('is_hom', {}),
+                           ('is_hom', {'allele': 1}), ('is_hom', {'allele': 8}),
+                           ('is_hom_ref', {}), ('is_hom_alt', {}), ('is_het', {}),
+                           ('is_het', {'allele': 1}), ('is_het', {'allele': 8}),
+                           ('is_call', {'call': call})):
+        expect = np.stack([getattr(v, method)(**kwargs) for v in vectors], axis=1)
+        actual = getattr(g, method)(**kwargs)
+        aeq(expect, actual)
+
+
+@kernel_params
+def test_genotype_count_kernel(ploidy, max_allele, layout, masked):
+    g = _kernel_genotype_data(ploidy, max_allele, layout, masked)
+    vectors = _kernel_vectors(g)
+    call = (0,) * (ploidy - 1) + (1,)
+    for method, kwargs in (('called', {}), ('missing', {}), ('hom', {}),
+                           ('hom', {'allele': 1}), ('hom', {'allele': 8}),
+                           ('hom_ref', {}), ('hom_alt', {}), ('het', {}),
+                           ('het', {'allele': 1}), ('het', {'allele': 8}),
+                           ('call', {'call': call})):
+        b = np.stack([getattr(v, 'is_' + method)(**kwargs) for v in vectors], axis=1)
+        for axis in None, 0, 1:
+            expect = np.sum(b, axis=axis)
+            actual = getattr(g, 'count_' + method)(axis=axis, **kwargs)
+            aeq(expect, actual)
+
+
+@kernel_params
+def test_genotype_transform_kernels(ploidy, max_allele, layout, masked):
+    g = _kernel_genotype_data(ploidy, max_allele, layout, masked)
+    vectors = _kernel_vectors(g)
+    for method, kwargs in (('to_n_ref', {'fill': -1}), ('to_n_ref', {'fill': 0}),
+                           ('to_n_alt', {'fill': -1}), ('to_n_alt', {'fill': 0}),
+                           ('to_allele_counts', {'max_allele': max_allele}),
+                           ('to_allele_counts', {'max_allele': 1})):
+        expect = np.stack([getattr(v, method)(**kwargs) for v in vectors], axis=1)
+        actual = getattr(g, method)(**kwargs)
+        aeq(expect, actual)
+        assert expect.dtype == actual.dtype
+
+
+@kernel_params
+def test_count_alleles_subpops_kernel(ploidy, max_allele, layout, masked):
+    g = _kernel_genotype_data(ploidy, max_allele, layout, masked)
+    n = g.shape[1]
+    # overlapping and unordered subpopulations
+    subpops = {'a': [0, 2, 4, 6], 'b': [n - 1, 1, 2, 3], 'c': list(range(n))}
+    for values in g, g.to_haplotypes():
+        called = values.values
+        if values is g and g.mask is not None:
+            called = np.where(g.mask[..., np.newaxis], -1, called)
+        actual = values.count_alleles_subpops(subpops, max_allele=max_allele)
+        assert sorted(subpops) == sorted(actual)
+        for name, subpop in subpops.items():
+            x = np.take(called, subpop, axis=1).reshape(len(called), -1)
+            expect = np.stack([np.sum(x == a, axis=1) for a in range(max_allele + 1)],
+                              axis=1)
+            aeq(expect, actual[name])
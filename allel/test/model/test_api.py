@@ -49,6 +49,11 @@ triploid_genotype_data = [
     [[-1, -1, -1], [-1, -1, -1], [-1, -1, -1]]
 ]
 
+haploid_genotype_data = [
+    [[0], [1], [-1], [2]],
+    [[-1], [2], [0], [1]]
+]
+
 triploid_genotype_ac_data = [
     [[3, 0, 0], [2, 1, 0], [0, 0, 0]],
     [[1, 2, 0], [0, 3, 0], [0, 0, 0]],
@@ -360,6 +365,12 @@ class GenotypeArrayInterface(object):
         actual = self.setup_instance(triploid_genotype_data).is_hom()
         aeq(expect, actual)
 
+        # haploid
+        expect = np.array([[1, 1, 0, 1],
+                           [0, 1, 1, 1]], dtype='b1')
+        actual = self.setup_instance(haploid_genotype_data).is_hom()
+        aeq(expect, actual)
+
     def test_is_hom_ref(self):
 
         # diploid
@@ -402,6 +413,12 @@ class GenotypeArrayInterface(object):
         actual = self.setup_instance(triploid_genotype_data).is_hom_alt()
         aeq(expect, actual)
 
+        # haploid
+        expect = np.array([[0, 1, 0, 1],
+                           [0, 1, 0, 1]], dtype='b1')
+        actual = self.setup_instance(haploid_genotype_data).is_hom_alt()
+        aeq(expect, actual)
+
     def test_is_hom_1(self):
 
         # diploid
@@ -459,6 +476,11 @@ class GenotypeArrayInterface(object):
         actual = self.setup_instance(triploid_genotype_data).is_call((0, 1, 2))
         aeq(expect, actual)
 
+        # wrong ploidy
+        g = self.setup_instance(diploid_genotype_data)
+        with pytest.raises(ValueError, match=r'invalid call ploidy: \(0, 1, 2\)'):
+            np.asarray(g.is_call((0, 1, 2)))
+
     def test_count_called(self):
 
         g = self.setup_instance(diploid_genotype_data)
@@ -510,6 +532,12 @@ class GenotypeArrayInterface(object):
         actual = f(axis=1)
         aeq(expect, actual)
 
+        # haploid
+        f = self.setup_instance(haploid_genotype_data).count_hom
+        assert 6 == f()
+        aeq([1, 2, 1, 2], f(axis=0))
+        aeq([3, 3], f(axis=1))
+
     def test_count_hom_ref(self):
 
         g = self.setup_instance(diploid_genotype_data)
@@ -544,6 +572,12 @@ class GenotypeArrayInterface(object):
         actual = f(axis=1)
         aeq(expect, actual)
 
+        # haploid
+        f = self.setup_instance(haploid_genotype_data).count_hom_alt
+        assert 4 == f()
+        aeq([0, 2, 0, 2], f(axis=0))
+        aeq([2, 2], f(axis=1))
+
     def test_count_het(self):
 
         g = self.setup_instance(diploid_genotype_data)
@@ -578,6 +612,11 @@ class GenotypeArrayInterface(object):
         actual = f(call=(2, 1), axis=1)
         aeq(expect, actual)
 
+        # wrong ploidy
+        for axis in None, 0, 1:
+            with pytest.raises(ValueError, match=r'invalid call ploidy: \(2,\)'):
+                np.asarray(f(call=(2,), axis=axis))
+
     # data transformation methods
     #############################
 
@@ -933,6 +972,8 @@ class GenotypeArrayInterface(object):
         assert 0 == g.count_hom_ref()
         assert 2 == g.count_hom_alt()
         assert 10 == g.count_missing()
+        aeq([2, 3, 5], g.count_missing(axis=0))
+        aeq([1, 1, 1, 0, 0], g.count_het(axis=1))
         expect_ac = [[1, 1, 0],
                      [1, 2, 1],
                      [1, 1, 0],
@@ -2419,6 +2460,12 @@ class VariantTableInterface(object):
         assert variant_table_names == s.names
         aeq(a[1:], s)
 
+        # strided row slice
+        s = vt[::2]
+        assert 3 == s.n_variants
+        assert variant_table_names == s.names
+        aeq(a[::2], s)
+
         # row index
         s = vt[1]
         # compare item by item
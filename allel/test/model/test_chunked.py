@@ -119,6 +119,49 @@ class GenotypeChunkedArrayTests(GenotypeArrayInterface, unittest.TestCase):
         with pytest.raises(NotImplementedError):
             g.take(indices, axis=0)
 
+    def test_max_cache(self):
+        data = np.array(diploid_genotype_data, dtype='i1')
+
+        # data wrapped by the user may be modified through another handle, so
+        # the maximum is not cached
+        g = self.setup_instance(data)
+        assert 2 == g.max()
+        assert g._max is None
+        g.values[0] = [[3, 3], [0, 0], [0, 0]]
+        assert 3 == g.max()
+        assert 4 == g.count_alleles().shape[1]
+
+        # arrays created by the library cache the maximum
+        c = self.setup_instance(data).copy()
+        assert 2 == c.max()
+        assert (5, 2) == c._max
+        assert 3 == c.count_alleles().shape[1]
+
+        # setting values through the wrapper clears the cache
+        c[0] = [[3, 3], [0, 0], [0, 0]]
+        assert c._max is None
+        assert 3 == c.max()
+        assert 4 == c.count_alleles().shape[1]
+        aeq([3, 3, 0, 0, 0, 0], c.to_haplotypes()[0])
+
+        # arrays holding the same values inherit the cached maximum
+        h = c.to_haplotypes()
+        assert (5, 3) == h._max
+        assert (5, 3) == h.to_genotypes(ploidy=2)._max
+        assert (5, 3) == c.copy()._max
+
+        # a partial copy does not inherit, but caches its own maximum
+        p = c.copy(start=1)
+        assert p._max is None
+        assert 2 == p.max()
+        assert (4, 2) == p._max
+
+        # data appended to the underlying storage is picked up
+        if hasattr(c.values, 'append'):
+            c.values.append(np.array([[[5, 5], [0, 0], [0, 0]]], dtype='i1'))
+            assert 5 == c.max()
+            assert (6, 5) == c._max
+
     def test_to_n_ref_array_like(self):
         # see also https://github.com/cggh/scikit-allel/issues/66
 
@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, division
+import threading
+import time
+
+
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+import zarr
+from numcodecs import Blosc, Zlib
+
+
+import allel
+from allel import chunked
+from allel.chunked import util as _util
+from allel.chunked import core as _core
+from allel.chunked.storage_zarr import align_chunklen
+
+
+@pytest.fixture(params=[1, 4], ids=['serial', 'parallel'])
+def n_cpus(request, monkeypatch):
+    monkeypatch.setattr(_util.multiprocessing, 'cpu_count', lambda: request.param)
+    return request.param
+
+
+def test_starmap_blocks_order(n_cpus):
+
+    def f(i, x):
+        # finish out of order
+        time.sleep(0.001 * ((7 - i) % 3))
+        return i, x * 2
+
+    blocks = [(i, i * 10) for i in range(20)]
+    expect = [(i, i * 20) for i in range(20)]
+    actual = list(_util.starmap_blocks(f, blocks))
+    assert expect == actual
+
+
+def test_starmap_blocks_exception(n_cpus):
+
+    def f(i):
+        if i == 5:
+            raise ValueError('foo')
+        return i
+
+    with pytest.raises(ValueError, match='foo'):
+        list(_util.starmap_blocks(f, ((i,) for i in range(20))))
+
+    # exceptions raised while reading blocks also reach the caller
+    def blocks():
+        for i in range(3):
+            yield i,
+        raise KeyError('bar')
+
+    with pytest.raises(KeyError, match='bar'):
+        list(_util.starmap_blocks(lambda i: i, blocks()))
+
+
+def test_starmap_blocks_serial(n_cpus):
+    main = threading.current_thread()
+
+    def f(i):
+        return threading.current_thread() is main, _util.is_serial()
+
+    results = list(_util.starmap_blocks(f, ((i,) for i in range(10))))
+    if n_cpus == 1:
+        # everything runs in the calling thread
+        assert _util.is_serial()
+        assert all(r == (True, True) for r in results)
+    else:
+        assert not _util.is_serial()
+        # blocks are computed in pool workers, which then run any nested
+        # block-wise computations serially rather than waiting on the pool
+        assert all(r == (False, True) for r in results)
+
+
+def test_read_ahead(n_cpus):
+    main = threading.current_thread()
+    threads = set()
+
+    def blocks():
+        for i in range(10):
+            threads.add(threading.current_thread())
+            yield i
+
+    assert list(range(10)) == list(_util.read_ahead(blocks()))
+    if n_cpus == 1:
+        assert {main} == threads
+    else:
+        assert main not in threads
+
+
+@pytest.mark.parametrize('consumer', ['read_ahead', 'starmap_blocks'])
+def test_read_ahead_close(consumer, monkeypatch):
+    monkeypatch.setattr(_util.multiprocessing, 'cpu_count', lambda: 2)
+    consumed = []
+    producers = []
+
+    def blocks():
+        producers.append(threading.current_thread())
+        i = 0
+        while True:
+            consumed.append(i)
+            yield i,
+            i += 1
+
+    if consumer == 'read_ahead':
+        it = _util.read_ahead(blocks())
+    else:
+        it = _util.starmap_blocks(lambda i: (i,), blocks())
+    assert (0,) == next(it)
+    assert (1,) == next(it)
+    it.close()
+
+    # the producer stops, rather than staying blocked on a full queue
+    assert 1 == len(producers)
+    producers[0].join(timeout=5)
+    assert not producers[0].is_alive()
+    # and it only ever read a bounded number of blocks ahead
+    assert len(consumed) <= 10
+
+
+def test_tree_reduce():
+    assert _core._tree_reduce(iter([]), np.add) is None
+    # results are combined in order, as a balanced tree
+    for n in range(1, 20):
+        actual = _core._tree_reduce((str(i) for i in range(n)), lambda a, b: a + b)
+        assert ''.join(str(i) for i in range(n)) == actual
+    assert ((('0', '1'), ('2', '3')), '4') == \
+        _core._tree_reduce((str(i) for i in range(5)), lambda a, b: (a, b))
+    actual = _core._tree_reduce(iter(range(8)), lambda a, b: (a, b))
+    assert (((0, 1), (2, 3)), ((4, 5), (6, 7))) == actual
+
+
+def test_reduce_blocks(n_cpus):
+    values = np.random.RandomState(42).randint(0, 100, size=(1000, 7)).astype('i4')
+    for blen in 1, 7, 100, 1000:
+        assert np.sum(values) == chunked.asum(values, blen=blen)
+        assert np.count_nonzero(values) == chunked.count_nonzero(values, blen=blen)
+        actual = chunked.asum(values, axis=0, blen=blen, storage='zarrmem')
+        assert_array_equal(np.sum(values, axis=0), actual[:])
+
+
+def test_combine():
+    a = np.array([1, 5, 3])
+    actual = _core._combine(np.maximum, a, np.array([4, 2, 6]))
+    # result written into the left operand
+    assert actual is a
+    assert [4, 5, 6] == actual.tolist()
+
+    # left operand not reused if it does not own its memory, is read-only,
+    # or the result would need a different shape or dtype
+    base = np.array([1, 5, 3, 0])
+    readonly = np.array([1, 5, 3])
+    readonly.flags.writeable = False
+    for a, b in ((base[:3], np.array([4, 2, 6])),
+                 (readonly, np.array([4, 2, 6])),
+                 (np.array([1, 5, 3]), np.array([[4, 2, 6], [0, 9, 0]])),
+                 (np.array([1, 5, 3], dtype='i1'), np.array([4, 2, 300], dtype='i2'))):
+        expect = np.maximum(a, b)
+        a_before = a.copy()
+        actual = _core._combine(np.maximum, a, b)
+        assert actual is not a
+        assert_array_equal(expect, actual)
+        assert expect.dtype == actual.dtype
+        assert_array_equal(a_before, a)
+    assert [1, 5, 3, 0] == base.tolist()
+
+    # nor if the block reducer is not a ufunc
+    a = np.array([1, 5, 3])
+    actual = _core._combine(lambda x, y: np.maximum(x, y), a, np.array([4, 2, 6]))
+    assert actual is not a
+    assert [1, 5, 3] == a.tolist()
+
+
+@pytest.mark.parametrize('f', ['amax', 'amin'])
+def test_amax_amin_blocks(f, n_cpus):
+    data = np.random.RandomState(42).randint(-100, 100, size=(100, 7, 2)).astype('i1')
+    data_before = data.copy()
+    for axis in None, 0, (0, 2), 1, 2:
+        expect = getattr(np, f)(data, axis=axis)
+        actual = getattr(chunked, f)(data, axis=axis, blen=7, storage='zarrmem')
+        assert_array_equal(expect, actual[...])
+    # combining block results in place never writes to the input
+    assert_array_equal(data_before, data)
+
+
+class _NoStorage(object):
+    # storage which fails on any attempt to create an output array
+
+    def __getattr__(self, name):
+        raise AssertionError('unexpected use of storage: %s' % name)
+
+
+def test_count_no_output_storage(n_cpus):
+    # counting over all axes reduces block by block, without storing an
+    # intermediate boolean array
+    rs = np.random.RandomState(42)
+    g = rs.randint(-1, 4, size=(100, 7, 2)).astype('i1')
+    h = g[:, :, 0]
+    ac = allel.GenotypeArray(g).count_alleles()
+    checks = (
+        (allel.GenotypeArray(g), allel.GenotypeChunkedArray(g),
+         ['count_called', 'count_missing', 'count_hom', 'count_hom_ref',
+          'count_hom_alt', 'count_het']),
+        (allel.HaplotypeArray(h), allel.HaplotypeChunkedArray(h),
+         ['count_called', 'count_missing', 'count_ref', 'count_alt']),
+        (ac, allel.AlleleCountsChunkedArray(ac),
+         ['count_variant', 'count_non_variant', 'count_segregating',
+          'count_non_segregating', 'count_singleton', 'count_doubleton']),
+    )
+    for a, ca, methods in checks:
+        for m in methods:
+            expect = getattr(a, m)()
+            actual = getattr(ca, m)(blen=10, storage=_NoStorage())
+            assert expect == actual, m
+
+
+class _Reads(object):
+    # array wrapper recording every read, and its length
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+        self.dtype = data.dtype
+        self.ndim = data.ndim
+        self.reads = []
+        self.items = []
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, item):
+        out = self.data[item]
+        self.reads.append(len(out))
+        self.items.append(item)
+        return out
+
+
+def test_count_streaming(n_cpus):
+    # counts are accumulated one block at a time, without overflowing the
+    # dtype of the data
+    n = 70000
+    checks = (
+        (allel.GenotypeChunkedArray, np.ones((n, 1, 2), dtype='i1'), 'count_hom_alt',
+         n, [n]),
+        (allel.HaplotypeChunkedArray, np.ones((n, 2), dtype='i1'), 'count_alt',
+         2 * n, [n, n]),
+        (allel.AlleleCountsChunkedArray, np.ones((n, 2), dtype='i1'), 'count_variant',
+         n, None),
+    )
+    for cls, values, m, expect, expect_axis0 in checks:
+        data = _Reads(values)
+        actual = getattr(cls(data), m)(blen=1000, storage=_NoStorage())
+        assert expect == actual
+        assert [1000] * 70 == sorted(data.reads)
+        if expect_axis0 is not None:
+            actual = getattr(cls(data), m)(axis=0, blen=1000, storage='zarrmem')
+            assert expect_axis0 == actual[:].tolist()
+
+
+def test_until():
+    assert [1, 5, 9] == list(_core._until(iter([1, 5, 9, 2, 9]), 9))
+    assert [1, 5, 2] == list(_core._until(iter([1, 5, 2]), 9))
+
+
+@pytest.mark.parametrize('f, dtype, bound', [
+    ('amax', 'i1', 127), ('amin', 'i1', -128), ('amax', 'u1', 255), ('amin', 'u1', 0),
+    ('amax', 'i4', 2**31 - 1),
+])
+def test_amax_amin_limit(f, dtype, bound, n_cpus):
+    values = np.ones((10000, 3), dtype=dtype)
+    values[150, 1] = bound
+
+    # reduction over all axes stops once a block reaches the dtype bound
+    data = _Reads(values)
+    assert bound == getattr(chunked, f)(data, blen=100)
+    if n_cpus == 1:
+        assert [100] * 2 == data.reads
+    else:
+        # only a bounded number of blocks are read ahead
+        assert len(data.reads) <= 20
+
+    # all blocks are read when reducing over an axis, or through a mapper
+    data = _Reads(values)
+    actual = getattr(chunked, f)(data, axis=0, blen=100, storage='zarrmem')
+    assert [1, bound, 1] == actual[:].tolist()
+    assert [100] * 100 == data.reads
+    data = _Reads(values)
+    assert bound == getattr(chunked, f)(data, blen=100, mapper=lambda x: x)
+    assert [100] * 100 == data.reads
+
+    # no early stop for floats
+    data = _Reads(values.astype('f8'))
+    assert bound == getattr(chunked, f)(data, blen=100)
+    assert [100] * 100 == data.reads
+
+
+def test_align_chunklen():
+    # nearest multiple of the block length
+    assert 900 == align_chunklen(1000, 300)
+    assert 600 == align_chunklen(500, 300)
+    assert 300 == align_chunklen(300, 300)
+    # nearest divisor of the block length
+    assert 100 == align_chunklen(100, 300)
+    assert 60 == align_chunklen(70, 300)
+    # no divisor nearby, leave as is
+    assert 7 == align_chunklen(7, 11)
+
+
+def test_store_blocks_chunks(n_cpus):
+    values = np.zeros((200000, 10), dtype='i1')
+
+    # a single block keeps the zarr heuristic
+    z = chunked.zarrmem_storage.array(values, expectedlen=len(values))
+    assert 25000 == z.chunks[0]
+
+    # output chunks line up with the blocks appended
+    for blen, chunklen in (1000, 25000), (3000, 24000), (7, 24997), (100000, 25000):
+        z = chunked.copy(values, blen=blen, storage='zarrmem')
+        assert (chunklen, 10) == z.chunks
+        assert values.shape == z.shape
+
+
+def test_store_blocks_appends(monkeypatch, n_cpus):
+    appends = []
+    append = zarr.Array.append
+
+    def record(self, data, **kwargs):
+        appends.append((len(self), len(self) + len(data)))
+        return append(self, data, **kwargs)
+
+    monkeypatch.setattr(zarr.Array, 'append', record)
+    values = np.arange(200000 * 2, dtype='i4').reshape(200000, 2)
+
+    # blocks are buffered and appended a whole output chunk at a time
+    z = chunked.copy(values, blen=1000, storage='zarrmem')
+    chunklen = z.chunks[0]
+    assert 0 == chunklen % 1000
+    assert 0 == 200000 % chunklen
+    expect = [(1000, chunklen)] + [(i, i + chunklen)
+                                   for i in range(chunklen, 200000, chunklen)]
+    assert expect == appends
+    assert_array_equal(values, z[:])
+
+    # chunks not aligned with blocks
+    del appends[:]
+    z = chunked.copy(values, blen=1000, storage='zarrmem', chunks=(1500, 2))
+    assert all(j % 1500 < 1000 for _, j in appends)
+    assert 200000 == appends[-1][1]
+    assert_array_equal(values, z[:])
+
+
+@pytest.mark.parametrize('sel1', [
+    list(range(5, 40)),
+    # runs out of order
+    list(range(30, 60)) + list(range(2, 20)),
+    list(range(64)),
+    # too few columns per run, gathered by index
+    list(range(10, 30)) + [45, 47],
+    [3, 1, 60, 10],
+    np.arange(64) % 3 == 0,
+])
+def test_subset_runs(sel1, n_cpus):
+    values = np.arange(300 * 64 * 2).reshape(300, 64, 2)
+    # selected rows fall either side of block boundaries, and some blocks have
+    # no rows selected
+    sel0 = [0, 1, 49, 50, 51, 99, 100, 101, 249, 250, 299]
+    expect = values[sel0][:, sel1]
+    actual = chunked.subset(values, sel0, sel1, blen=50, storage='zarrmem')
+    assert_array_equal(expect, actual[:])
+    sel0 = np.zeros(300, dtype=bool)
+    sel0[45:160] = True
+    expect = values[sel0][:, sel1]
+    actual = chunked.subset(values, sel0, sel1, blen=50, storage='zarrmem')
+    assert_array_equal(expect, actual[:])
+
+
+def test_compress_take_columns(n_cpus):
+    values = np.arange(300 * 64).reshape(300, 64)
+    for sel in [5, 9, 20], [20, 5, 9], [63], [0, 63]:
+        cols = slice(min(sel), max(sel) + 1)
+
+        # only the range of columns spanning the selection is read
+        condition = np.zeros(64, dtype=bool)
+        condition[sel] = True
+        data = _Reads(values)
+        actual = chunked.compress(condition, data, axis=1, blen=50, storage='zarrmem')
+        assert_array_equal(np.compress(condition, values, axis=1), actual[:])
+        assert [50] * 6 == data.reads
+        assert all(item[1] == cols for item in data.items)
+
+        data = _Reads(values)
+        actual = chunked.take(data, sel, axis=1, blen=50, storage='zarrmem')
+        assert_array_equal(np.take(values, sel, axis=1), actual[:])
+        assert [50] * 6 == data.reads
+        assert all(item[1] == cols for item in data.items)
+
+    # out of range indices are handled by numpy as usual
+    for mode in 'wrap', 'clip':
+        actual = chunked.take(values, [70, 3], axis=1, mode=mode, blen=50,
+                              storage='zarrmem')
+        assert_array_equal(np.take(values, [70, 3], axis=1, mode=mode), actual[:])
+    with pytest.raises(IndexError):
+        chunked.take(values, [70, 3], axis=1, blen=50, storage='zarrmem')
+
+
+def test_zarr_default_compressor(monkeypatch):
+    storage = chunked.zarrmem_storage
+
+    # 1-byte data are bit shuffled, wider data keep the zarr default
+    for dtype in 'i1', 'u1', 'b1':
+        z = storage.array(np.zeros(100, dtype=dtype))
+        assert Blosc(cname='lz4', clevel=5, shuffle=Blosc.BITSHUFFLE) == z.compressor
+    for dtype in 'i2', 'i4', 'f8':
+        z = storage.array(np.zeros(100, dtype=dtype))
+        assert Blosc() == z.compressor
+
+    # explicit compressor takes precedence
+    z = storage.array(np.zeros(100, dtype='i1'), compressor=Zlib(level=1))
+    assert Zlib(level=1) == z.compressor
+
+    # so does a default compressor configured by the user
+    monkeypatch.setattr(zarr.storage, 'default_compressor', Zlib(level=1))
+    z = storage.array(np.zeros(100, dtype='i1'))
+    assert Zlib(level=1) == z.compressor
+
+
+def test_bcolz_default_cparams():
+    bcolz = pytest.importorskip('bcolz')
+    storage = chunked.bcolzmem_storage
+
+    # 1-byte data are bit shuffled, wider data keep the bcolz defaults
+    for dtype in 'i1', 'u1', 'b1':
+        a = storage.array(np.zeros(100, dtype=dtype))
+        assert 'lz4' == a.cparams.cname
+        assert bcolz.BITSHUFFLE == a.cparams.shuffle
+    for dtype in 'i2', 'i4', 'f8':
+        a = storage.array(np.zeros(100, dtype=dtype))
+        assert 'lz4' == a.cparams.cname
+        assert bcolz.SHUFFLE == a.cparams.shuffle
+
+    # explicit cparams take precedence
+    a = storage.array(np.zeros(100, dtype='i1'),
+                      cparams=bcolz.cparams(cname='zlib', clevel=1))
+    assert 'zlib' == a.cparams.cname
+
+    # so do defaults configured by the user
+    cparams = {'clevel': 1, 'shuffle': bcolz.SHUFFLE, 'cname': 'zlib', 'quantize': 0}
+    with bcolz.defaults_ctx(cparams=cparams):
+        a = storage.array(np.zeros(100, dtype='i1'))
+    assert 'zlib' == a.cparams.cname
+    assert bcolz.SHUFFLE == a.cparams.shuffle